@@ -1,17 +1,32 @@
+import json
+import xml.etree.ElementTree as ET
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterator, Optional
 from zipfile import BadZipFile
 
-from docx import Document
-from flask import Flask, jsonify, render_template, request, wrappers
+from flask import Flask, Response, jsonify, render_template, request, wrappers
 
+from src import pipeline
 from src.analyzer import Analyzer
 from src.helpers import create_response
-from src.report.report import Report
+from src.jobs import Job, JobQueue, JobQueueFull
+from src.report.docx_text import paragraph_texts
+from src.report.draft import ReportDraft
+from src.report.stava import STAVA_POOL
+from src.result_cache import RESULT_CACHE, ResultCache
+from src.rules.rules import get_rules
 
 APP: Flask = Flask(__name__)
 APP.config["JSON_AS_ASCII"] = False
 
+# Max number of files in a batch and the number of files analyzed at the same time.
+MAX_BATCH_FILES: int = 100
+BATCH_EXECUTOR: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=4)
+
+# Documents posted to /api/jobs are analyzed here instead of in the request thread.
+JOBS: JobQueue = JobQueue(workers=4, max_queued=64)
+
 
 class APIError(Exception):
     "Class for handling error responses for the API."
@@ -51,6 +66,59 @@ def canvas() -> str:
     return render_template("canvas.html")
 
 
+def check_filename(filename: Optional[str]) -> None:
+    if not filename or ".docx" not in filename:
+        raise APIError("Dokumentet måste vara i docx format", 415)
+
+
+def read_draft(filename: Optional[str], content: bytes) -> ReportDraft:
+    """Read the draft of the report from the uploaded docx file. Only the text of the
+    paragraphs is read, without building the python-docx object model."""
+    check_filename(filename)
+    try:
+        with BytesIO(content) as source_stream:
+            draft = ReportDraft(paragraphs=paragraph_texts(source_stream))
+    except (BadZipFile, KeyError, ET.ParseError):
+        raise APIError("Kunde inte läsa dokumentet.", 400)
+    return draft
+
+
+def analyze_document(
+    draft: ReportDraft, on_complete: Optional[Callable[[Analyzer], None]] = None
+) -> Dict[str, Any]:
+    """Run the full analysis on the draft of the document and return the result. If
+    the annotation is not done in time on_complete gets the full analysis later."""
+    analyser: Analyzer = pipeline.analyze(draft, on_complete=on_complete)
+    return analyser.get_analysis()
+
+
+def analyze_upload(
+    filename: Optional[str], content: bytes, draft: Optional[ReportDraft] = None
+) -> Dict[str, Any]:
+    """Run the full analysis on an uploaded docx file. The result is cached on the
+    content of the file, the rules and the stava version, so a document that is
+    submitted again is answered without being analyzed. Analyses where tests had to
+    be skipped are not cached, the full analysis is cached once the annotation is
+    done instead."""
+    check_filename(filename)
+    key: str = ResultCache.key(content, get_rules().fingerprint, STAVA_POOL.version())
+    result: Optional[Dict[str, Any]] = RESULT_CACHE.get(key)
+    if result is None:
+        if draft is None:
+            draft = read_draft(filename, content)
+        result = analyze_document(
+            draft,
+            on_complete=lambda analyzer: _cache_result(key, analyzer.get_analysis()),
+        )
+        _cache_result(key, result)
+    return result
+
+
+def _cache_result(key: str, result: Dict[str, Any]) -> None:
+    if not result["skipped"]:
+        RESULT_CACHE.set(key, result)
+
+
 @APP.route("/api/docx", methods=["POST"])
 def docx_post() -> wrappers.Response:
     """This is the API route to analyze docx files."""
@@ -60,22 +128,125 @@ def docx_post() -> wrappers.Response:
         raise APIError("Dokumentet måste POSTas som en fil.")
 
     file = request.files["file"]
-    if ".docx" not in file.filename:
-        raise APIError("Dokumentet måste vara i docx format", 415)
+    result: Dict[str, Any] = analyze_upload(file.filename, file.read())
+    return jsonify(create_response("ok", data=result))
+
+
+@APP.route("/api/docx/stream", methods=["POST"])
+def docx_stream_post() -> wrappers.Response:
+    """Same as /api/docx but the result is streamed as newline delimited JSON. The
+    first line has the text of the report, then comes one line with the errors of
+    every test as soon as the test is done and last a line with the summary."""
+    if len(request.files) != 1:
+        raise APIError("Du måste POSTa exakt en fil.")
+    if "file" not in request.files:
+        raise APIError("Dokumentet måste POSTas som en fil.")
+
+    file = request.files["file"]
+    draft: ReportDraft = read_draft(file.filename, file.read())
+    analyzer: Analyzer = pipeline.start_analysis(draft)
+
+    def generate() -> Iterator[str]:
+        yield _ndjson({"event": "start", "report": analyzer.draft.to_text()})
+        try:
+            for test, errors in pipeline.analyze_iter(analyzer):
+                yield _ndjson({"event": "test", "test": test, "errors": errors})
+        except Exception:
+            APP.logger.exception("Could not analyze %s", file.filename)
+            yield _ndjson(
+                {"event": "error", "message": "Kunde inte analysera dokumentet."}
+            )
+            return
+        yield _ndjson(
+            {
+                "event": "done",
+                "has_errors": analyzer.has_errors(),
+                "skipped": analyzer.skipped,
+            }
+        )
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+def _ndjson(event: Dict[str, Any]) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+
+@APP.route("/api/jobs", methods=["POST"])
+def job_post() -> wrappers.Response:
+    """Same as /api/docx but the document is only queued for analysis. The response
+    has the id of the job, the result is fetched from /api/jobs/<id>."""
+    if len(request.files) != 1:
+        raise APIError("Du måste POSTa exakt en fil.")
+    if "file" not in request.files:
+        raise APIError("Dokumentet måste POSTas som en fil.")
 
-    document: Document
+    file = request.files["file"]
+    filename: Optional[str] = file.filename
+    content: bytes = file.read()
+    draft: ReportDraft = read_draft(filename, content)
     try:
-        source_stream = BytesIO(file.read())
-        document = Document(source_stream)
-        source_stream.close()
-    except BadZipFile:
-        raise APIError("Kunde inte läsa dokumentet.", 400)
+        job: Job = JOBS.submit(lambda: analyze_upload(filename, content, draft))
+    except JobQueueFull:
+        raise APIError("Servern är upptagen, försök igen om en stund.", 429)
+
+    response: wrappers.Response = jsonify(
+        create_response("ok", 202, data={"id": job.id, "status": job.status})
+    )
+    response.status_code = 202
+    return response
 
-    report: Report = Report(document)
 
-    analyser: Analyzer = Analyzer(report)
-    analyser.run()
-    return jsonify(create_response(f"ok", data=analyser.get_analysis()))
+@APP.route("/api/jobs/<job_id>", methods=["GET"])
+def job_get(job_id: str) -> wrappers.Response:
+    """The status of a job, and the analysis once the job is done."""
+    job: Optional[Job] = JOBS.get(job_id)
+    if job is None:
+        raise APIError("Jobbet finns inte.", 404)
+    if job.status == "failed":
+        raise APIError("Kunde inte analysera dokumentet.", 500)
+    return jsonify(
+        create_response(
+            "ok", data={"id": job.id, "status": job.status, "result": job.result}
+        )
+    )
+
+
+def _analyze_file(filename: str, content: bytes) -> Dict[str, Any]:
+    try:
+        return create_response("ok", data=analyze_upload(filename, content))
+    except APIError as error:
+        return error.to_dict()
+    except Exception:
+        APP.logger.exception("Could not analyze %s", filename)
+        return create_response("Kunde inte analysera dokumentet.", 500)
+
+
+@APP.route("/api/docx/batch", methods=["POST"])
+def docx_batch_post() -> wrappers.Response:
+    """API route to analyze many docx files in one request. The files are analyzed in
+    parallel and the result of each file is keyed by its filename. A file that fails
+    gets an error response of its own without affecting the other files."""
+    files = request.files.getlist("files")
+    if not files:
+        raise APIError("Du måste POSTa minst en fil.")
+    if len(files) > MAX_BATCH_FILES:
+        raise APIError(f"Du kan POSTa högst {MAX_BATCH_FILES} filer åt gången.", 413)
+
+    futures: Dict[str, "Future[Dict[str, Any]]"] = {}
+    for file in files:
+        filename: str = file.filename or "dokument"
+        name: str = filename
+        copy: int = 1
+        while name in futures:
+            copy += 1
+            name = f"{filename} ({copy})"
+        futures[name] = BATCH_EXECUTOR.submit(_analyze_file, filename, file.read())
+
+    results: Dict[str, Any] = {
+        name: future.result() for name, future in futures.items()
+    }
+    return jsonify(create_response("ok", data=results))
 
 
 if __name__ == "__main__":
@@ -1,11 +1,14 @@
 """ Cache all docx files in Sparv found in DOC_PATH. Should be placed in root of repo to run.
+Documents that are already cached are not sent to Sparv again.
 """
 
 import os
 
 from docx import Document
 
-from src.report.report import Report
+from src.analyzer import SPARV_PROFILE
+from src.report.annotation_cache import ANNOTATION_CACHE
+from src.report import batch
 
 DOC_PATH = "docx"
 
@@ -19,17 +22,19 @@ def get_document_list():
 
 
 def create_reports(files):
-    count = len(files)
-    for file in files:
-        print(f"{count} reports left...")
-        count -= 1
-        document = Document(f"{DOC_PATH}/{file}")
-        Report(document)
+    documents = [Document(f"{DOC_PATH}/{file}") for file in files]
+    print(f"Creating {len(documents)} reports...")
+    batch.create_reports(documents, settings=SPARV_PROFILE)
 
 
 def main():
     files = get_document_list()
     create_reports(files)
+    stats = ANNOTATION_CACHE.stats()
+    print(
+        f"Cache hits: {stats['hits']}, misses: {stats['misses']}, "
+        f"entries: {stats['entries']}, size: {stats['size']} bytes"
+    )
 
 
 if __name__ == "__main__":
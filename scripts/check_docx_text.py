@@ -0,0 +1,62 @@
+"""Check that the lean docx reader gives the same Sparv XML as python-docx. Every
+document in DOC_PATH is read both ways, the paragraph texts and the XML of the drafts
+must be identical and a document python-docx can not open must fail in the lean
+reader too. Run it from the root of the repo with:
+
+    python -m scripts.check_docx_text
+"""
+
+import glob
+import sys
+import xml.etree.ElementTree as ET
+from zipfile import BadZipFile
+
+from docx import Document
+
+from src.report.docx_text import paragraph_texts
+from src.report.draft import ReportDraft
+
+DOC_PATH = "test/docs"
+
+
+def check(path):
+    """Returns a description of what differs, or None if nothing does."""
+    try:
+        document = Document(path)
+    except Exception:
+        try:
+            list(paragraph_texts(path))
+        except (BadZipFile, KeyError, ET.ParseError):
+            return None
+        return "python-docx can not read it but paragraph_texts() can"
+
+    expected = [paragraph.text for paragraph in document.paragraphs]
+    texts = list(paragraph_texts(path))
+    if texts != expected:
+        for index, (text, paragraph) in enumerate(zip(texts, expected)):
+            if text != paragraph:
+                return f"paragraph {index} is {text!r}, expected {paragraph!r}"
+        return f"{len(texts)} paragraphs, expected {len(expected)}"
+
+    if ReportDraft(paragraphs=texts).to_xml() != ReportDraft(document).to_xml():
+        return "the Sparv XML differs"
+    return None
+
+
+def main():
+    paths = sorted(glob.glob(f"{DOC_PATH}/*.docx"))
+    failed = 0
+    for path in paths:
+        difference = check(path)
+        if difference:
+            failed += 1
+            print(f"FAIL {path}: {difference}")
+        else:
+            print(f"ok   {path}")
+    print(f"{len(paths) - failed} of {len(paths)} documents are read the same way")
+    if failed or not paths:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
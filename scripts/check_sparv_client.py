@@ -0,0 +1,206 @@
+"""Check the Sparv client and a Report that uses it against a local stub of the Sparv
+API, so it can be run without network access. The stub tags every word as a noun.
+Run it from the root of the repo with:
+
+    python -m scripts.check_sparv_client
+"""
+
+import asyncio
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape, quoteattr
+
+from src.report.draft import ReportDraft
+from src.report.report import SPARV_SETTINGS, Report
+from src.report.sparv_client import (
+    CircuitBreaker,
+    SparvClient,
+    SparvError,
+    SparvUnavailable,
+)
+
+PARAGRAPHS = ["INLEDNING", "Polisen kom till platsen. Mannen greps.", "BROTTET", "Rån."]
+
+
+def annotate(text):
+    """Annotate the XML text the way Sparv does, with a simple tokenizer."""
+    parts = ["<result><corpus>"]
+    for text_node in ET.fromstring(f"<root>{text}</root>"):
+        parts.append(f"<text title={quoteattr(text_node.get('title', ''))}>")
+        for paragraph in text_node:
+            parts.append(f"<paragraph name={quoteattr(paragraph.get('name'))}>")
+            for sentence in paragraph:
+                original = quoteattr(sentence.get("original"))
+                parts.append(f"<sentence original={original}>")
+                for token in re.findall(r"\w+|[^\w\s]", sentence.text or ""):
+                    pos = "NN" if token[0].isalnum() else "MAD"
+                    parts.append(
+                        f'<w pos="{pos}" lemma="|{escape(token.lower())}|">'
+                        f"{escape(token)}</w>"
+                    )
+                parts.append("</sentence>")
+            parts.append("</paragraph>")
+        parts.append("</text>")
+    parts.append("</corpus></result>")
+    return "\n".join(parts)
+
+
+class Stub(BaseHTTPRequestHandler):
+    """Answers like Sparv. The class attributes decide how the next requests fail."""
+
+    requests = 0
+    failures = 0
+    status = 503
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        Stub.requests += 1
+        length = int(self.headers["Content-Length"])
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+        time.sleep(Stub.delay)
+        if Stub.failures:
+            Stub.failures -= 1
+            self.send_response(Stub.status)
+            self.end_headers()
+            return
+        body = annotate(form["text"][0]).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting, like in check_timeout().
+            pass
+
+
+def reset(failures=0, status=503, delay=0.0):
+    Stub.requests = 0
+    Stub.failures = failures
+    Stub.status = status
+    Stub.delay = delay
+
+
+def check_report(url):
+    client = SparvClient(url)
+    draft = ReportDraft(paragraphs=PARAGRAPHS)
+    report = Report(None, cache=None, sparv=client, draft=draft)
+    assert [headline.name for headline in report.headlines] == ["INLEDNING", "BROTTET"]
+    assert [word.text for word in report.get_words()][:3] == ["Polisen", "kom", "till"]
+    assert report.to_text() == draft.to_text()
+
+
+def check_stream(url):
+    client = SparvClient(url)
+    text = ReportDraft(paragraphs=PARAGRAPHS).to_xml()
+    streamed = b"".join(client.annotate_stream(text, SPARV_SETTINGS, chunk_size=64))
+    assert streamed.decode("utf-8").strip() == client.annotate(text, SPARV_SETTINGS)
+
+
+def check_retries(url):
+    reset(failures=2)
+    client = SparvClient(url, retries=2, backoff=0.01)
+    client.annotate(ReportDraft(paragraphs=PARAGRAPHS).to_xml(), SPARV_SETTINGS)
+    assert Stub.requests == 3, Stub.requests
+
+
+def check_client_errors(url):
+    reset(failures=1, status=400)
+    client = SparvClient(url, retries=2, backoff=0.01)
+    try:
+        client.annotate("<text/>", SPARV_SETTINGS)
+    except SparvError as error:
+        assert error.status_code == 400
+    else:
+        raise AssertionError("no error")
+    assert Stub.requests == 1, Stub.requests
+    assert not client.breaker.is_open()
+
+
+def check_timeout(url):
+    reset(delay=0.5)
+    client = SparvClient(url, read_timeout=0.1, retries=0)
+    try:
+        client.annotate("<text/>", SPARV_SETTINGS)
+    except SparvError:
+        pass
+    else:
+        raise AssertionError("no timeout")
+
+
+def check_breaker(url):
+    reset(failures=100)
+    client = SparvClient(
+        url, retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    )
+    for _ in range(2):
+        try:
+            client.annotate("<text/>", SPARV_SETTINGS)
+        except SparvUnavailable:
+            raise AssertionError("opened too early")
+        except SparvError:
+            pass
+    requests = Stub.requests
+    try:
+        client.annotate("<text/>", SPARV_SETTINGS)
+    except SparvUnavailable:
+        pass
+    else:
+        raise AssertionError("not open")
+    assert Stub.requests == requests
+
+
+def check_async(url):
+    client = SparvClient(url)
+    texts = [
+        ReportDraft(paragraphs=["INLEDNING", f"Text {i}."]).to_xml() for i in range(8)
+    ]
+
+    async def annotate_all():
+        return await asyncio.gather(
+            *(client.annotate_async(text, SPARV_SETTINGS) for text in texts)
+        )
+
+    results = asyncio.run(annotate_all())
+    for number, result in enumerate(results):
+        assert f'<w pos="NN" lemma="|{number}|">{number}</w>' in result, result
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    failed = 0
+    for check in (
+        check_report,
+        check_stream,
+        check_retries,
+        check_client_errors,
+        check_timeout,
+        check_breaker,
+        check_async,
+    ):
+        reset()
+        try:
+            check(url)
+            print(f"ok   {check.__name__}")
+        except AssertionError as error:
+            failed += 1
+            print(f"FAIL {check.__name__}: {error!r}")
+    server.shutdown()
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Check the stava pool against scripts/fake_stava.py, so it can be run without stava
+installed. Run it from the root of the repo with:
+
+    python -m scripts.check_stava_pool
+"""
+
+import sys
+
+from src.report.stava import SpellingCache, StavaPool, check_words
+
+FAKE_STAVA = [sys.executable, "scripts/fake_stava.py"]
+TEXT = "Han blev misshandlt på en platts nära stationen"
+EXPECTED = {"misshandlt": ["misshandlat"], "platts": ["plats", "platsen"]}
+
+
+def check_answers(pool):
+    for _ in range(3):
+        assert pool.check(TEXT) == EXPECTED, pool.check(TEXT)
+    assert pool.check("Inga fel här") == {}
+
+
+def check_restart(pool):
+    pool.check(TEXT)
+    for process in pool._processes:
+        if process.is_alive():
+            process._process.kill()
+            process._process.wait()
+    assert pool.check(TEXT) == EXPECTED
+
+
+def check_health(pool):
+    pool.check(TEXT)
+    for process in pool._processes:
+        if process.is_alive():
+            process._process.kill()
+            process._process.wait()
+    pool.health_check()
+    assert all(process.is_alive() for process in pool._processes if process.started)
+
+
+def check_one_shot(pool):
+    assert pool.check_once(TEXT) == EXPECTED
+
+
+def check_cache(pool):
+    cache = SpellingCache()
+    words = TEXT.split(" ")
+    first = check_words(words, (), pool, cache)
+    assert {word: first[word] for word in EXPECTED} == EXPECTED
+    hits = cache.hits
+    assert check_words(words, (), pool, cache) == first
+    assert cache.hits - hits == len(words)
+
+
+def main():
+    failed = 0
+    for check in (
+        check_answers,
+        check_restart,
+        check_health,
+        check_one_shot,
+        check_cache,
+    ):
+        pool = StavaPool(args=FAKE_STAVA, timeout=5, health_interval=0)
+        try:
+            check(pool)
+            print(f"ok   {check.__name__}")
+        except AssertionError as error:
+            failed += 1
+            print(f"FAIL {check.__name__}: {error!r}")
+        finally:
+            pool.close()
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
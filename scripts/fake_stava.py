@@ -0,0 +1,30 @@
+"""Stand in for stava that can be used to run the spellchecker pool without stava
+installed. Reads text from stdin and answers like stava, line by line. Words in
+MISSPELLED and the end markers sent by the pool are reported as misspelled. Use it by
+creating the pool with:
+
+    StavaPool(args=["python", "scripts/fake_stava.py"])
+"""
+
+import re
+import sys
+
+MISSPELLED = {
+    "platts": ["plats", "platsen"],
+    "misshandlt": ["misshandlat"],
+    "polis-": [],
+}
+
+
+def main():
+    for line in sys.stdin:
+        for word in re.findall(r"[\w-]+", line):
+            if word in MISSPELLED:
+                suggestions = " ".join(MISSPELLED[word]) or "?"
+                print(f"{word}: {suggestions}", flush=True)
+            elif word.startswith("xqx"):
+                print(f"{word}: ?", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ import os
 import json
 
 from docx import Document
-from src.report import Report
+from src.report.batch import create_reports
 
 PATH = "/home/kalle/Downloads/Arkiv/*"
 
@@ -29,11 +29,11 @@ def gather_statistics(documents):
     fail_count = 0
     total = len(documents.keys())
 
-    for filename, document in documents.items():
+    reports = dict(zip(documents.keys(), create_reports(list(documents.values()))))
+    for filename, report in reports.items():
         print(f"Now analyzing document: {count}/{total}, failed: {fail_count}")
         count += 1
         try:
-            report = Report(document)
             statistics[filename] = {
                 "tonality": report.tonality(),
                 "reading_attributes": report.reading_attributes(),
@@ -1,33 +1,148 @@
 import re
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from enum import IntEnum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 from fuzzywuzzy import fuzz, process
 
+from src.report.draft import DraftHeadline, DraftWord, ReportDraft
 from src.report.headline import Headline
-from src.report.report import Report
+from src.report.report import Report, sparv_settings
+from src.report.stava import StavaError
 from src.report.word import Word
-from src.rules.rule_structures import HeadlineRules
-from src.rules.rules import Rules
+from src.rules.rule_structures import GrammarRule, HeadlineRules
+from src.rules.rules import (
+    FORBIDDEN_WORDS,
+    POLICE_ABBREVIATIONS,
+    UNWANTED_WORDS,
+    Rules,
+    get_rules,
+)
+from src.rules.word_scanner import WordHit
+
+TestMethod = TypeVar("TestMethod", bound=Callable[..., None])
+
+
+class Tier(IntEnum):
+    """The input an analyzer test needs. Tests of the TEXT, STRUCTURE and TOKENS tiers
+    can run on the draft of a report, before it has been annotated by Sparv. TOKENS
+    tests read the words of the draft, which have no annotation."""
+
+    TEXT = 0
+    STRUCTURE = 1
+    TOKENS = 2
+    ANNOTATION = 3
+
+
+def tier(level: Tier, *attributes: str) -> Callable[[TestMethod], TestMethod]:
+    """Decorator that declares the tier of an analyzer test and the Sparv attributes
+    it reads from the words and named entities of the report."""
+
+    def decorate(test: TestMethod) -> TestMethod:
+        setattr(test, "tier", level)
+        setattr(test, "sparv_attributes", frozenset(attributes))
+        return test
+
+    return decorate
 
 
 class Analyzer:
     """Class for analysing documents."""
 
-    def __init__(self, report: Report, stop_on_error: bool = False) -> None:
+    # All tests except the sanity test.
+    TESTS: Tuple[str, ...] = (
+        "test_headlines_predefined",
+        "test_headlines_required",
+        "test_headlines_dependencies",
+        "test_headlines_order",
+        "test_headlines_named_entities",
+        "test_named_entities",
+        "test_reading_attributes",
+        "test_forbidden_words",
+        "test_forbidden_baseforms",
+        "test_unwanted_words",
+        "test_police_abbreviations",
+        "test_spelling",
+        "test_grammar_rules_regex",
+    )
+
+    def __init__(
+        self,
+        report: Optional[Report] = None,
+        stop_on_error: bool = False,
+        rules: Optional[Rules] = None,
+        grammar: Optional["Future[List[Tuple[GrammarRule, Tuple[int, int]]]]"] = None,
+        draft: Optional[ReportDraft] = None,
+    ) -> None:
         """Instantiate the object. The report argument is a dict where the keys are
         the header of the documents and the value is a list of paragraphs under the
-        heading."""
-        self.rules = Rules()
-        self.report: Report = report
+        heading. The rules shared by the process are used unless rules are given.
+        grammar can hold the matches of the grammar rules if they are already being
+        matched against the text of the report.
+
+        Without a report only the tests that can run on the draft are possible, the
+        report can be attached later with attach_report()."""
+        if draft is None:
+            if report is None:
+                raise Exception("Analyzer needs a report or a draft of one.")
+            draft = report.draft
+        self.rules: Rules = rules if rules is not None else get_rules()
+        self.draft: ReportDraft = draft
+        self._report: Optional[Report] = None
         self.errors: List[Dict[str, Union[str, int]]] = []
         self.stop_on_error: bool = stop_on_error
+        self._hits: Optional[Dict[str, List[WordHit]]] = None
+        self._draft_hits: Optional[Dict[str, List[WordHit]]] = None
+        self.grammar_matches: Optional[
+            "Future[List[Tuple[GrammarRule, Tuple[int, int]]]]"
+        ] = grammar
+        self._done: Set[str] = set()
+        self._stopped: bool = False
+        # Tests that could not run because the report was never annotated or a service
+        # they need could not be used.
+        self.skipped: List[str] = []
+        # Every headline in the draft and report resolved to its rules once.
+        self.headline_rules: Dict[
+            Union[Headline, DraftHeadline], Optional[HeadlineRules]
+        ] = {
+            headline: self.rules.get_headline_rules(headline.name)
+            for headline in draft.headlines
+        }
+        if report is not None:
+            self.attach_report(report)
+
+    @property
+    def report(self) -> Report:
+        if self._report is None:
+            raise Exception("The report has not been annotated yet.")
+        return self._report
+
+    def attach_report(self, report: Report) -> None:
+        """Attach the annotated report so the rest of the tests can run."""
+        self._report = report
+        for headline in report.headlines:
+            self.headline_rules[headline] = self.rules.get_headline_rules(headline.name)
 
     def add_error(
         self,
         message: str,
         position: Optional[Tuple[int, int]] = None,
-        headline: Optional[Headline] = None,
-        word: Optional[Word] = None,
+        headline: Optional[Union[Headline, DraftHeadline]] = None,
+        word: Optional[Union[Word, DraftWord]] = None,
     ) -> None:
         """Add an error to the error list."""
         start: int = 0
@@ -35,61 +150,110 @@ class Analyzer:
 
         if position:
             start, end = position
+        elif isinstance(headline, DraftHeadline):
+            start, end = self.draft.get_headline_position(headline)
         elif headline:
             start, end = self.report.get_headline_position(headline)
         elif word:
-            start, end = self.report.get_word_postion(word)
+            start, end = self._word_position(word)
 
         self.errors.append({"message": message, "start": start, "end": end})
 
+    def _word_position(self, word: Union[Word, DraftWord]) -> Tuple[int, int]:
+        if isinstance(word, DraftWord):
+            return word.position
+        return self.report.get_word_postion(word)
+
     def get_analysis(self) -> Dict[str, Any]:
         """The result of the analysis as a dict. Formatted to be used as an API reponse.
         """
         return {
-            "report": self.report.to_text(),
-            "errors": sorted(self.errors, key=lambda k: k["start"]),
+            "report": self.draft.to_text(),
+            "errors": self._sorted_errors(self.errors),
             "has_errors": self.has_errors(),
+            "skipped": self.skipped,
         }
 
+    @staticmethod
+    def _sorted_errors(
+        errors: List[Dict[str, Union[str, int]]]
+    ) -> List[Dict[str, Union[str, int]]]:
+        return sorted(errors, key=lambda k: k["start"])
+
     def has_errors(self) -> bool:
         """Returns a boolean representing if the analyzer has found errors or not."""
         if self.errors:
             return True
         return False
 
-    def run(self) -> None:
-        """Runs a full analysis on the document."""
-        self.test_sanity()
-        if self.has_errors():
-            return
-
-        tests: List[Callable[[], None]] = [
-            self.test_headlines_predefined,
-            self.test_headlines_required,
-            self.test_headlines_dependencies,
-            self.test_headlines_order,
-            self.test_headlines_named_entities,
-            self.test_named_entities,
-            self.test_reading_attributes,
-            self.test_forbidden_words,
-            self.test_unwanted_words,
-            self.test_police_abbreviations,
-            self.test_spelling,
-            self.test_grammar_rules_regex,
-        ]
+    def tests(self) -> List[Callable[[], None]]:
+        """All tests except the sanity test, ordered by tier."""
+        tests: List[Callable[[], None]] = [getattr(self, name) for name in self.TESTS]
+        return sorted(tests, key=lambda test: getattr(test, "tier"))
+
+    @classmethod
+    def sparv_attributes(cls) -> FrozenSet[str]:
+        """The Sparv attributes read by the tests, the annotation needs nothing more."""
+        return frozenset(
+            attribute
+            for name in ("test_sanity",) + cls.TESTS
+            for attribute in getattr(getattr(cls, name), "sparv_attributes")
+        )
 
-        for test in tests:
-            if self.stop_on_error and self.has_errors():
+    def run(self, max_tier: Tier = Tier.ANNOTATION) -> None:
+        """Runs the tests up to and including max_tier that have not been run yet. The
+        default is to run a full analysis on the document."""
+        for _ in self.run_iter(max_tier):
+            pass
+
+    def run_iter(
+        self, max_tier: Tier = Tier.ANNOTATION
+    ) -> Iterator[Tuple[str, List[Dict[str, Union[str, int]]]]]:
+        """Same as run() but yields the name of every test together with the errors it
+        found as soon as the test is done."""
+        if "test_sanity" not in self._done:
+            self._done.add("test_sanity")
+            count: int = len(self.errors)
+            self.test_sanity()
+            if self.has_errors():
+                self._stopped = True
+            yield "test_sanity", self._sorted_errors(self.errors[count:])
+
+        for test in self.tests():
+            if self._stopped or getattr(test, "tier") > max_tier:
                 break
+            if test.__name__ in self._done:
+                continue
+            self._done.add(test.__name__)
+            count = len(self.errors)
             test()
+            # Stop right away, the next test may be of a tier that is not run now and
+            # the analysis must be finished before anything is sent to Sparv.
+            if self.stop_on_error and self.has_errors():
+                self._stopped = True
+            yield test.__name__, self._sorted_errors(self.errors[count:])
+
+    def skip_remaining(self) -> None:
+        """Give up on the tests that have not been run, used when the report can not be
+        annotated in time. The analysis is finished with the results so far."""
+        self.skipped += [
+            test.__name__ for test in self.tests() if test.__name__ not in self._done
+        ]
+        self._stopped = True
+
+    def is_finished(self) -> bool:
+        """If there are no more tests to run, either because all have been run or
+        because the analysis was stopped by an error."""
+        return self._stopped or len(self._done) == len(self.tests()) + 1
 
+    @tier(Tier.STRUCTURE)
     def test_sanity(self) -> None:
         """Test to se if the document has the proper format and can be used in the other
         tests."""
-        if self.report.headlines:
+        if self.draft.headlines:
             return
 
-        if self.report.document.paragraphs:
+        if self.draft.paragraph_count:
             self.add_error(
                 "Rubrikerna i dokumentet är felformaterade eller saknas. "
                 "Rubrikerna ska vara skrivna i versaler och ha samma "
@@ -97,13 +261,14 @@ class Analyzer:
                 "Rubriker avslutas med radbrytning."
             )
 
-        if not self.report.document.paragraphs:
+        if not self.draft.paragraph_count:
             self.add_error("Ditt dokument är antigen tomt eller i fel format.")
 
+    @tier(Tier.STRUCTURE)
     def test_headlines_predefined(self) -> None:
         """Test to make sure the headlines exists in the list of predefined ones."""
-        for headline in self.report.headlines:
-            if not self.rules.get_headline_rules(headline.name):
+        for headline in self.draft.headlines:
+            if not self.headline_rules[headline]:
                 headlines = [headline.name for headline in self.rules.headlines]
                 suggestion, _ = process.extractOne(
                     headline.name, headlines, scorer=fuzz.partial_ratio
@@ -120,42 +285,30 @@ class Analyzer:
                     headline=headline,
                 )
 
+    @tier(Tier.STRUCTURE)
     def test_headlines_required(self) -> None:
         """Make sure required headlines are present."""
+        present: Set[Optional[HeadlineRules]] = set(self.headline_rules.values())
         for rule in self.rules.headlines:
-            if not rule.required:
-                continue
-            is_match: bool = False
-            for headline in self.report.headlines:
-                if self.rules.get_headline_rules(headline.name) == rule:
-                    is_match = True
-                    break
-            if not is_match:
+            if rule.required and rule not in present:
                 self.add_error(f"Rubriken {rule.name} som måste vara med saknas.")
 
+    @tier(Tier.STRUCTURE)
     def test_headlines_dependencies(self) -> None:
         """Test if the headlines dependencies are satified."""
 
-        def has_dep(dep: str) -> bool:
-            for h in self.report.headlines:
-                if self.rules.get_headline_rules(
-                    h.name
-                ) == self.rules.get_headline_rules(dep):
-                    return True
-            return False
+        present: Set[Optional[HeadlineRules]] = set(self.headline_rules.values())
 
-        for headline in self.report.headlines:
-            rule: Optional[HeadlineRules] = self.rules.get_headline_rules(headline.name)
+        for headline in self.draft.headlines:
+            rule: Optional[HeadlineRules] = self.headline_rules[headline]
             if not rule:
                 continue
 
             for dependency_group in rule.dependencies:
-                is_match: bool = False
-                for dependency in dependency_group:
-                    if has_dep(dependency):
-                        is_match = True
-                        break
-                if not is_match:
+                if not any(
+                    self.rules.get_headline_rules(dependency) in present
+                    for dependency in dependency_group
+                ):
                     dependencies_list: str = ", ".join(dependency_group)
                     self.add_error(
                         f"Rubriken {headline.name} kräver att en av följande "
@@ -163,12 +316,13 @@ class Analyzer:
                         headline=headline,
                     )
 
+    @tier(Tier.STRUCTURE)
     def test_headlines_order(self) -> None:
         """Test if the headlines are in correct order."""
         last: Tuple[int, str] = (0, "")
 
-        for headline in self.report.headlines:
-            rule: Optional[HeadlineRules] = self.rules.get_headline_rules(headline.name)
+        for headline in self.draft.headlines:
+            rule: Optional[HeadlineRules] = self.headline_rules[headline]
             if (not rule) or (rule.order is None):
                 continue
 
@@ -184,10 +338,11 @@ class Analyzer:
 
             last = (rule.order, headline.name)
 
+    @tier(Tier.ANNOTATION, "ex", "type", "subtype")
     def test_headlines_named_entities(self) -> None:
         """Test if the headlines required named entities are present."""
         for headline in self.report.headlines:
-            rule: Optional[HeadlineRules] = self.rules.get_headline_rules(headline.name)
+            rule: Optional[HeadlineRules] = self.headline_rules[headline]
             if not (rule and rule.named_entities):
                 continue
 
@@ -196,138 +351,189 @@ class Analyzer:
                     ne_rule.identity, ne_rule.type, ne_rule.subtype
                 ):
                     continue
-                if ne_rule.cheat and re.search(ne_rule.cheat, headline.to_text()):
+                if ne_rule.cheat and ne_rule.cheat.search(headline.to_text()):
                     continue
                 self.add_error(ne_rule.message, headline=headline)
 
+    @tier(Tier.ANNOTATION, "pos")
     def test_reading_attributes(self) -> None:
         """Test if the reading attributes of the text passes the min,max rules
-        of LIX."""
+        of LIX. The error points to the headline with the highest or lowest LIX,
+        which is the section that pulls the report out of range the most."""
+        headlines: List[Headline] = [
+            headline for headline in self.report.headlines if headline.readability.words
+        ]
         if self.report.lix > self.rules.lix_max:
             self.add_error(
-                "LIX värdet för rapporten är högt. Försök korta ner meningarna."
+                "LIX värdet för rapporten är högt. Försök korta ner meningarna.",
+                headline=max(headlines, key=lambda h: h.readability.lix, default=None),
             )
 
         if self.report.lix < self.rules.lix_min:
             self.add_error(
-                "LIX värdet för rapporten är lågt. Försök skriva längre meningar."
+                "LIX värdet för rapporten är lågt. Försök skriva längre meningar.",
+                headline=min(headlines, key=lambda h: h.readability.lix, default=None),
             )
 
+    @tier(Tier.ANNOTATION, "ex", "type", "subtype")
     def test_named_entities(self) -> None:
         """Test global named entity rules."""
         for named_entitity_rule in self.rules.named_entities:
-            identity: str = named_entitity_rule["identity"]
-            type: Optional[str] = named_entitity_rule.get("type")
-            subtype: Optional[str] = named_entitity_rule.get("subtype")
-            invalid: Optional[str] = named_entitity_rule.get("invalid")
-            valid: Optional[str] = named_entitity_rule.get("valid")
-
-            for named_entity in self.report.get_named_entities(identity, type, subtype):
-                text: str = " ".join([w.text for w in named_entity.words])
-                if valid and (not re.search(valid, text, re.I)):
+            valid: Optional[Pattern[str]] = named_entitity_rule.valid
+            invalid: Optional[Pattern[str]] = named_entitity_rule.invalid
+
+            for named_entity in self.report.get_named_entities(
+                named_entitity_rule.identity,
+                named_entitity_rule.type,
+                named_entitity_rule.subtype,
+            ):
+                text: str = named_entity.text
+                if valid and (not valid.search(text)):
                     self.add_error(
-                        named_entitity_rule["message"],
-                        self.report.get_words_position(named_entity.words),
+                        named_entitity_rule.message,
+                        self.report.get_named_entity_position(named_entity),
                     )
-                elif invalid and re.search(invalid, text, re.I):
+                elif invalid and invalid.search(text):
                     self.add_error(
-                        named_entitity_rule["message"],
-                        self.report.get_words_position(named_entity.words),
+                        named_entitity_rule.message,
+                        self.report.get_named_entity_position(named_entity),
                     )
 
+    def _word_hits(self, word_list: str) -> List[WordHit]:
+        """Hits in the report for one of the word lists. All word lists are scanned in
+        one pass the first time any of them is needed."""
+        if self._hits is None:
+            self._hits = self.rules.word_scanner.scan(self.report.get_words())
+        return self._hits[word_list]
+
+    def _draft_word_hits(self, word_list: str) -> List[WordHit]:
+        """Same as _word_hits() for the words of the draft, which can be scanned before
+        the report has been annotated. Only the text of the words is matched."""
+        if self._draft_hits is None:
+            self._draft_hits = self.rules.word_scanner.scan(self.draft.get_tokens())
+        return self._draft_hits[word_list]
+
+    def _add_forbidden_word_errors(self, hits: List[WordHit]) -> None:
+        """Forbidden words that follow each other are reported as one error."""
+        groups: List[List[WordHit]] = []
+        for hit in hits:
+            if groups and groups[-1][-1].index + 1 == hit.index:
+                groups[-1].append(hit)
+            else:
+                groups.append([hit])
+
+        for group in groups:
+            combo: str = " ".join([hit.word.text for hit in group])
+            self.add_error(
+                f"Ordet {combo} får endast förekomma i citat.",
+                position=(
+                    self._word_position(group[0].word)[0],
+                    self._word_position(group[-1].word)[1],
+                ),
+            )
+
+    @tier(Tier.TOKENS)
     def test_forbidden_words(self) -> None:
-        """Test if there are any sensitive/swear words outside of the citations."""
-        pad_open: bool = False
-        words: List[Word] = self.report.get_words()
-        forbidden_words: List[Word] = []
-        last_error: bool = False
-
-        for word in words:
-            if word.text in self.rules.citation_delimiters:
-                pad_open = not pad_open
-                continue
-            if pad_open:
-                continue
-            if (word.text in self.rules.forbidden_words) or any(
-                [b in self.rules.forbidden_words for b in word.baseform]
-            ):
-                forbidden_words.append(word)
-                last_error = True
-                continue
-            if last_error:
-                last_error = False
-                combo = " ".join([w.text for w in forbidden_words])
-                start, _ = self.report.get_word_postion(forbidden_words[0])
-                _, end = self.report.get_word_postion(forbidden_words[-1])
-                self.add_error(
-                    f"Ordet {combo} får endast förekomma i citat.", position=(start,end)
-                )
+        """Test if there are any sensitive/swear words outside of the citations, as they
+        are written in the document."""
+        self._add_forbidden_word_errors(
+            [
+                hit
+                for hit in self._draft_word_hits(FORBIDDEN_WORDS)
+                if not hit.in_citation
+            ]
+        )
+
+    @tier(Tier.ANNOTATION, "lemma")
+    def test_forbidden_baseforms(self) -> None:
+        """Test if there are any inflected forms of sensitive/swear words outside of
+        the citations. Words written as in the list are found by
+        test_forbidden_words."""
+        self._add_forbidden_word_errors(
+            [
+                hit
+                for hit in self._word_hits(FORBIDDEN_WORDS)
+                if not hit.in_citation
+                and hit.word.text not in self.rules.forbidden_words
+            ]
+        )
 
+    @tier(Tier.TOKENS)
     def test_unwanted_words(self) -> None:
         """Test if there are any unwanted words outside of the citations and report them with a
         suggestion what to use instead."""
-        pad_open: bool = False
-        for word in self.report.get_words():
-            if word.text in self.rules.citation_delimiters:
-                pad_open = not pad_open
-                continue
-            if pad_open:
+        for hit in self._draft_word_hits(UNWANTED_WORDS):
+            if hit.in_citation:
                 continue
-            for u_word in self.rules.unwanted_words:
-                if word.text == u_word["word"]:
-                    self.add_error(
-                        f"Ordet {word.text} är inte tillåtet, "
-                        f"använd {u_word['alternative']} istället.",
-                        word=word,
-                    )
-                    break
+            self.add_error(
+                f"Ordet {hit.word.text} är inte tillåtet, "
+                f"använd {hit.value} istället.",
+                word=hit.word,
+            )
 
+    @tier(Tier.TOKENS)
     def test_police_abbreviations(self):
         """Test if the report contains any unwanted police abbreviations."""
-        for word in self.report.get_words():
-            for uword in self.rules.police_abbreviations:
-                if uword["word"] == word.text.lower():
-                    self.add_error(
-                        f"{word.text} är en intern förkortning. "
-                        f"Använd {uword['means']} istället.",
-                        word=word,
-                    )
+        for hit in self._draft_word_hits(POLICE_ABBREVIATIONS):
+            self.add_error(
+                f"{hit.word.text} är en intern förkortning. "
+                f"Använd {hit.value} istället.",
+                word=hit.word,
+            )
 
+    @tier(Tier.ANNOTATION, "pos")
     def test_spelling(self) -> None:
-        """Test the spelling in the report."""
-        misstakes: Dict[Word, List[str]] = self.report.spellcheck(
-            self.rules.spelling_skip_wordclasses
-        )
+        """Test the spelling in the report. The test is skipped if stava can not be
+        used."""
+        try:
+            misstakes: Dict[Word, List[str]] = self.report.spellcheck(
+                self.rules.spelling_skip_wordclasses
+            )
+        except StavaError:
+            self.skipped.append("test_spelling")
+            return
         for word, corrections in misstakes.items():
             if word.text.lower() in self.rules.forbidden_words:
                 continue
-            if word.text.lower() in [
-                ab["word"] for ab in self.rules.police_abbreviations
-            ]:
+            if word.text.lower() in self.rules.police_abbreviations:
                 continue
             error_text: str = f"Ordet {word.text} är felstavat."
             if corrections:
                 error_text += " Rättningsförslag: " + ", ".join(corrections) + "."
             self.add_error(error_text, word=word)
 
+    @tier(Tier.TEXT)
     def test_grammar_rules_regex(self) -> None:
-        """Test grammatical rules by matching against regex'es."""
-        for rule in self.rules.grammar_regex:
-            positions: List[Tuple[int, int]] = self.report.get_regex_postions(
-                rule["regex"], ignore_case=True
-            )
-            for position in positions:
-                self.add_error(rule["message"], position=position)
-
+        """Test grammatical rules by matching against regex'es. The test is skipped if
+        the rules are not matched within the time budget of the grammar engine."""
+        matches: List[Tuple[GrammarRule, Tuple[int, int]]]
+        if self.grammar_matches is not None:
+            try:
+                # A regex can not be interrupted while it is matching, so the scan
+                # may run past its own budget and is not waited for any longer.
+                matches = self.grammar_matches.result(
+                    timeout=self.rules.grammar.timeout
+                )
+            except FutureTimeoutError:
+                self.skipped.append("test_grammar_rules_regex")
+                return
+        else:
+            matches = self.rules.grammar.scan(self.draft.to_text())
+        for rule, position in matches:
+            self.add_error(rule.message, position=position)
+
+    @tier(Tier.ANNOTATION, "sentiment")
     def test_tonality(self) -> None:
         """Test the tonality of the report."""
-        tonality: float = 0.0
-
-        for word in self.report.get_words():
-            tonality = tonality + word.sentiment
+        tonality: float = self.report.get_sentiment()
 
         if tonality < self.rules.tonality_min:
             self.add_error("Tonaliteten i rapporten är för negativ.")
 
         if tonality > self.rules.tonality_max:
             self.add_error("Tonaliteten i rapporten är för positiv.")
+
+
+# Sparv settings with only the attributes the analyzer reads, used for all reports
+# that are analyzed.
+SPARV_PROFILE: str = sparv_settings(Analyzer.sparv_attributes())
@@ -0,0 +1,82 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+LOGGER: logging.Logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted to a queue that is already full."""
+
+
+class Job:
+    """A unit of work and its result. The status goes from queued to running and
+    ends as done or failed."""
+
+    def __init__(self) -> None:
+        self.id: str = uuid.uuid4().hex
+        self.status: str = "queued"
+        self.result: Any = None
+        self.finished_at: Optional[float] = None
+
+
+class JobQueue:
+    """Runs jobs on a pool of worker threads.
+
+    At most max_queued jobs wait for a worker, further jobs are refused with
+    JobQueueFull so the caller can tell the client to come back later. The result of
+    a finished job is kept for keep_results seconds.
+
+    """
+
+    def __init__(
+        self, workers: int = 4, max_queued: int = 64, keep_results: float = 600.0
+    ) -> None:
+        self.keep_results: float = keep_results
+        self._queue: "queue.Queue[Tuple[Job, Callable[[], Any]]]" = queue.Queue(
+            maxsize=max_queued
+        )
+        self._jobs: Dict[str, Job] = {}
+        self._lock: threading.Lock = threading.Lock()
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, function: Callable[[], Any]) -> Job:
+        """Queue the function and return its job right away."""
+        self._expire()
+        job: Job = Job()
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job, function))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise JobQueueFull("Too many jobs are waiting")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self) -> None:
+        while True:
+            job, function = self._queue.get()
+            job.status = "running"
+            try:
+                job.result = function()
+                job.status = "done"
+            except Exception:
+                LOGGER.exception("Job %s failed", job.id)
+                job.status = "failed"
+            job.finished_at = time.monotonic()
+
+    def _expire(self) -> None:
+        oldest: float = time.monotonic() - self.keep_results
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.finished_at is not None and job.finished_at < oldest:
+                    del self._jobs[job_id]
@@ -0,0 +1,187 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from docx import Document
+
+from src.analyzer import SPARV_PROFILE, Analyzer, Tier
+from src.report.draft import ReportDraft
+from src.report.report import Report, is_annotation_cached
+from src.report.sparv_client import SPARV_CLIENT, SparvError, SparvUnavailable
+from src.report.stava import SPELLING_CACHE, STAVA_POOL, check_words
+from src.rules.rule_structures import GrammarRule
+from src.rules.rules import Rules, get_rules
+from src.single_flight import SingleFlight
+
+# Runs the work that only needs the text of a document while Sparv annotates it.
+EXECUTOR: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=32)
+
+# Matches the grammar rules. The scans take milliseconds and the tests only wait for
+# them as long as the budget of the grammar engine, so they must not be queued behind
+# the annotations and spellchecks on EXECUTOR.
+GRAMMAR_EXECUTOR: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=8)
+
+# Finishes the analyses that were answered without the annotation once it is done. It
+# is kept apart from EXECUTOR since the tests wait for the spellcheck running there.
+COMPLETIONS: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=4)
+
+# Seconds a request waits for the annotation before answering without it.
+ANNOTATION_DEADLINE: float = 20.0
+
+# Max number of reports being annotated at once, the rest are answered without it.
+ANNOTATION_SLOTS: threading.BoundedSemaphore = threading.BoundedSemaphore(16)
+
+# Reports being annotated keyed on the XML sent to Sparv. Identical documents
+# submitted at the same time wait for the same report instead of annotating it again.
+ANNOTATIONS: "SingleFlight[Report]" = SingleFlight()
+
+
+def analyze(
+    document: Union[Document, ReportDraft],
+    stop_on_error: bool = False,
+    deadline: Optional[float] = ANNOTATION_DEADLINE,
+    on_complete: Optional[Callable[[Analyzer], None]] = None,
+) -> Analyzer:
+    """Run a full analysis of the document, or of its draft if it has already been
+    read.
+
+    The tests that only need the text, the headlines and the words as written run on the
+    draft of the report first. If they already stop the analysis the document is never
+    sent to Sparv. Otherwise the spellcheck of the words in the draft is started before
+    the report is sent to Sparv. The grammar rules and the spellcheck run while waiting
+    for the annotation and the analyzer picks up their results, which makes the time
+    spent roughly the slowest of Sparv and stava instead of their sum. A document that
+    is already being annotated for another request shares that annotation.
+
+    If Sparv fails, is known to be down or has not answered within deadline seconds
+    the analysis is returned with the results so far and the tests that need the
+    annotation listed as skipped. The annotation is not cancelled, once it is done it
+    is cached for the next request and on_complete is called with a full analysis.
+
+    """
+    analyzer: Analyzer = start_analysis(document, stop_on_error)
+    for _ in analyze_iter(analyzer, deadline, on_complete):
+        pass
+    return analyzer
+
+
+def start_analysis(
+    document: Union[Document, ReportDraft], stop_on_error: bool = False
+) -> Analyzer:
+    """Create the analyzer for the draft of the document and start matching the
+    grammar rules against its text. The tests are run by analyze_iter()."""
+    rules: Rules = get_rules()
+    draft: ReportDraft = (
+        document if isinstance(document, ReportDraft) else ReportDraft(document)
+    )
+
+    grammar: "Future[List[Tuple[GrammarRule, Tuple[int, int]]]]" = (
+        GRAMMAR_EXECUTOR.submit(rules.grammar.scan, draft.to_text())
+    )
+    return Analyzer(
+        stop_on_error=stop_on_error, rules=rules, grammar=grammar, draft=draft
+    )
+
+
+def analyze_iter(
+    analyzer: Analyzer,
+    deadline: Optional[float] = ANNOTATION_DEADLINE,
+    on_complete: Optional[Callable[[Analyzer], None]] = None,
+) -> Iterator[Tuple[str, List[Dict[str, Union[str, int]]]]]:
+    """Run the analysis the same way as analyze() but yield the name and the errors
+    of every test as soon as it is done. The tests that can run on the draft are run
+    before the document is sent to Sparv."""
+    start: float = time.monotonic()
+    yield from analyzer.run_iter(Tier.TOKENS)
+    if analyzer.is_finished():
+        return
+
+    annotation: Optional["Future[Report]"] = None
+    if not SPARV_CLIENT.breaker.is_open():
+        try:
+            annotation = ANNOTATIONS.run(
+                analyzer.draft.to_xml(), lambda: _start_annotation(analyzer)
+            )
+        except SparvUnavailable:
+            pass
+    if annotation is None:
+        # Sparv can not be used now, a resubmitted document may still be cached.
+        cached: Optional[Report] = _cached_report(analyzer)
+        if cached is None:
+            analyzer.skip_remaining()
+            return
+        analyzer.attach_report(cached)
+        yield from analyzer.run_iter()
+        return
+
+    timeout: Optional[float] = None
+    if deadline is not None:
+        timeout = max(0.0, start + deadline - time.monotonic())
+    try:
+        report: Report = annotation.result(timeout=timeout)
+    except FutureTimeoutError:
+        SPARV_CLIENT.breaker.record_failure()
+        analyzer.skip_remaining()
+        if on_complete is not None:
+            annotation.add_done_callback(
+                lambda future: COMPLETIONS.submit(
+                    _complete, future, analyzer, on_complete
+                )
+            )
+        return
+    except SparvError:
+        analyzer.skip_remaining()
+        return
+
+    analyzer.attach_report(report)
+    yield from analyzer.run_iter()
+
+
+def _cached_report(analyzer: Analyzer) -> Optional[Report]:
+    """The report of the draft if every section of it is in the annotation cache."""
+    draft: ReportDraft = analyzer.draft
+    if not is_annotation_cached(draft, SPARV_PROFILE):
+        return None
+    try:
+        return Report(draft.document, draft=draft, settings=SPARV_PROFILE)
+    except SparvError:
+        # A section was evicted after the check and Sparv can still not be used.
+        return None
+
+
+def _start_annotation(analyzer: Analyzer) -> "Future[Report]":
+    """Start the spellcheck of the draft and the annotation of the report."""
+    if not ANNOTATION_SLOTS.acquire(blocking=False):
+        raise SparvUnavailable("Too many reports are being annotated")
+    draft: ReportDraft = analyzer.draft
+    spelling: "Future[Dict[str, Optional[List[str]]]]" = EXECUTOR.submit(
+        check_words,
+        draft.get_words(),
+        analyzer.rules.spelling_skip_wordclasses,
+        STAVA_POOL,
+        SPELLING_CACHE,
+    )
+    annotation: "Future[Report]" = EXECUTOR.submit(
+        Report, draft.document, draft=draft, spelling=spelling, settings=SPARV_PROFILE
+    )
+    annotation.add_done_callback(lambda _: ANNOTATION_SLOTS.release())
+    return annotation
+
+
+def _complete(
+    annotation: "Future[Report]",
+    degraded: Analyzer,
+    on_complete: Callable[[Analyzer], None],
+) -> None:
+    if annotation.exception() is not None:
+        return
+    analyzer: Analyzer = Analyzer(
+        annotation.result(),
+        stop_on_error=degraded.stop_on_error,
+        rules=degraded.rules,
+        grammar=degraded.grammar_matches,
+    )
+    analyzer.run()
+    on_complete(analyzer)
@@ -0,0 +1,87 @@
+import xml.etree.ElementTree as ET
+from typing import Callable, Iterator, List, Optional, Tuple, Union, cast
+from xml.sax.saxutils import quoteattr
+
+from src.report.headline import Headline
+from src.report.sentence import Sentence
+from src.report.word import TokenStore
+
+
+class AnnotationBuilder:
+    """Builds the headlines of a report from an annotation while it is being read.
+
+    The annotation is fed to the builder in chunks. Every sentence is turned into a
+    Sentence as soon as its end tag has been parsed and its element is then dropped,
+    so the parsed tree never holds more than one sentence. If on_section is given the
+    paragraphs are serialized again one sentence at a time and on_section is called
+    with the index, the headline and the annotation of every section as soon as it has
+    been parsed, so it can be cached without keeping the annotation of the document.
+
+    """
+
+    def __init__(
+        self,
+        store: Optional[TokenStore] = None,
+        on_section: Optional[Callable[[int, Headline, str], None]] = None,
+    ) -> None:
+        """The words are added to the store, a store of its own is used if none is
+        given."""
+        self.store: TokenStore = store if store is not None else TokenStore()
+        self.headlines: List[Headline] = []
+        self.on_section: Optional[Callable[[int, Headline, str], None]] = on_section
+        self._parser: ET.XMLPullParser = ET.XMLPullParser(events=("start", "end"))
+        self._started: bool = False
+        self._stack: List[ET.Element] = []
+        self._sentences: List[Sentence] = []
+        self._parts: List[str] = []
+
+    def feed(self, data: Union[str, bytes]) -> None:
+        if not self._started:
+            # Sparv answers with whitespace before the XML declaration.
+            data = data.lstrip()
+            if not data:
+                return
+            self._started = True
+        self._parser.feed(data)
+        self._handle_events()
+
+    def close(self) -> List[Headline]:
+        """Finish parsing and return the headlines."""
+        self._parser.close()
+        self._handle_events()
+        return self.headlines
+
+    def _handle_events(self) -> None:
+        # Only start and end events are asked for and they always have an element.
+        events: Iterator[Tuple[str, ET.Element]] = cast(
+            Iterator[Tuple[str, ET.Element]], self._parser.read_events()
+        )
+        for event, element in events:
+            if event == "start":
+                self._stack.append(element)
+                continue
+
+            self._stack.pop()
+            if element.tag == "sentence":
+                self._sentences.append(Sentence(element, self.store))
+                if self.on_section is not None:
+                    self._parts.append(ET.tostring(element, encoding="unicode"))
+            elif element.tag == "paragraph":
+                headline: Headline = Headline(element, self._sentences)
+                self.headlines.append(headline)
+                if self.on_section is not None:
+                    attributes: str = "".join(
+                        f" {name}={quoteattr(value)}"
+                        for name, value in element.attrib.items()
+                    )
+                    self.on_section(
+                        len(self.headlines) - 1,
+                        headline,
+                        f"<paragraph{attributes}>{''.join(self._parts)}</paragraph>",
+                    )
+                self._sentences = []
+                self._parts = []
+            else:
+                continue
+            if self._stack:
+                self._stack[-1].remove(element)
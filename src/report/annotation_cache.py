@@ -0,0 +1,173 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+CACHE_PATH: str = "cache/sparv"
+
+
+class AnnotationCache:
+    """Content addressed on-disk cache for annotations returned by the Sparv API.
+
+    Entries are keyed on a hash of the XML sent to Sparv together with the Sparv
+    settings, so any change to the document or the settings results in a new entry.
+    Writes go through a temporary file that is atomically renamed into place which
+    makes the cache safe to share between several worker processes. Entries older
+    than max_age seconds are dropped and when the cache grows larger than max_size
+    bytes the least recently used entries are evicted until it is down to low_water
+    of max_size, so the cache is not scanned again on the next write.
+
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        max_size: int = 512 * 1024 * 1024,
+        max_age: float = 30 * 24 * 60 * 60,
+        low_water: float = 0.9,
+    ) -> None:
+        self.path: str = path
+        self.max_size: int = max_size
+        self.max_age: float = max_age
+        self.low_water: float = low_water
+        self.hits: int = 0
+        self.misses: int = 0
+        self._size: Optional[int] = None
+        self._lock: threading.Lock = threading.Lock()
+        self._evicting: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        """Create a cache key from the text sent to Sparv and its settings."""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key + ".xml")
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached annotation for key or None if there is no valid entry."""
+        path: str = self._entry_path(key)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.max_age:
+                self._remove(path)
+                self._count(False)
+                return None
+            with open(path, "r", encoding="utf-8") as file:
+                data: str = file.read()
+            # Touch the entry so the eviction treats it as recently used.
+            os.utime(path)
+        except FileNotFoundError:
+            self._count(False)
+            return None
+        self._count(True)
+        return data
+
+    def contains(self, key: str) -> bool:
+        """If there is a valid entry for key, without reading it."""
+        try:
+            return time.time() - os.stat(self._entry_path(key)).st_mtime <= self.max_age
+        except FileNotFoundError:
+            return False
+
+    def set(self, key: str, data: str) -> None:
+        """Store the annotation data under key."""
+        path: str = self._entry_path(key)
+        directory: str = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            else:
+                self._size += len(data.encode("utf-8"))
+            over_limit: bool = self._size > self.max_size
+        if over_limit:
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove expired entries and then the least recently used ones until the cache
+        is down to low_water of max_size. Does nothing if another thread is already
+        evicting."""
+        if not self._evicting.acquire(blocking=False):
+            return
+        try:
+            self._evict()
+        finally:
+            self._evicting.release()
+
+    def _evict(self) -> None:
+        now: float = time.time()
+        entries: List[Tuple[float, str, int]] = []
+        for entry in self._entries():
+            if now - entry[0] > self.max_age:
+                self._remove(entry[1])
+            else:
+                entries.append(entry)
+
+        total: int = sum(entry[2] for entry in entries)
+        target: float = self.max_size * self.low_water
+        for _, path, size in sorted(entries):
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+
+        with self._lock:
+            self._size = total
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters for this process and the current size of the cache."""
+        entries: List[Tuple[float, str, int]] = list(self._entries())
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "size": sum(entry[2] for entry in entries),
+        }
+
+    def _entries(self) -> Iterator[Tuple[float, str, int]]:
+        if not os.path.isdir(self.path):
+            return
+        for directory, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(".xml"):
+                    continue
+                path: str = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Removed by another worker.
+                    continue
+                yield stat.st_mtime, path, stat.st_size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+ANNOTATION_CACHE: AnnotationCache = AnnotationCache()
@@ -0,0 +1,81 @@
+import xml.etree.ElementTree as ET
+from typing import Iterator, List, Optional, Sequence
+
+from docx import Document
+
+from src.report.annotation_cache import ANNOTATION_CACHE, AnnotationCache
+from src.report.report import SPARV_SETTINGS, Report, convert_document_to_xml
+from src.report.sparv_client import SPARV_CLIENT, SparvClient, SparvError
+
+# Max number of characters of XML sent to Sparv in one batch.
+MAX_BATCH_SIZE: int = 1000000
+
+
+def create_reports(
+    documents: Sequence[Document],
+    cache: Optional[AnnotationCache] = ANNOTATION_CACHE,
+    sparv: SparvClient = SPARV_CLIENT,
+    max_batch_size: int = MAX_BATCH_SIZE,
+    settings: str = SPARV_SETTINGS,
+) -> List[Report]:
+    """Create a report for every document with as few calls to Sparv as possible.
+
+    Documents that are not cached are packed together, one text node per document,
+    into batches of at most max_batch_size characters. Each batch is sent to Sparv
+    in one request and the response is split back into one annotation per document,
+    which is cached the same way as when a single report is created.
+
+    """
+    texts: List[str] = [convert_document_to_xml(document) for document in documents]
+    keys: List[str] = [AnnotationCache.key(text, settings) for text in texts]
+    annotations: List[Optional[ET.Element]] = [None] * len(documents)
+
+    if cache is not None:
+        for index, key in enumerate(keys):
+            cached: Optional[str] = cache.get(key)
+            if cached is not None:
+                annotations[index] = ET.fromstring(cached)
+
+    missing: List[int] = [i for i, node in enumerate(annotations) if node is None]
+    for batch in _batches(missing, texts, max_batch_size):
+        sparv_data: str = sparv.annotate(
+            "".join(texts[index] for index in batch), settings
+        )
+        text_nodes: List[ET.Element] = ET.fromstring(sparv_data).findall("corpus/text")
+        if len(text_nodes) != len(batch):
+            raise SparvError(
+                f"Sparv returned {len(text_nodes)} texts for a batch of {len(batch)}"
+            )
+
+        for index, text_node in zip(batch, text_nodes):
+            root_node: ET.Element = ET.Element("result")
+            ET.SubElement(root_node, "corpus").append(text_node)
+            if cache is not None:
+                cache.set(keys[index], ET.tostring(root_node, encoding="unicode"))
+            annotations[index] = root_node
+
+    return [
+        Report(
+            document,
+            cache=cache,
+            sparv=sparv,
+            annotation=annotation,
+            settings=settings,
+        )
+        for document, annotation in zip(documents, annotations)
+    ]
+
+
+def _batches(
+    indexes: List[int], texts: List[str], max_batch_size: int
+) -> Iterator[List[int]]:
+    batch: List[int] = []
+    size: int = 0
+    for index in indexes:
+        if batch and size + len(texts[index]) > max_batch_size:
+            yield batch
+            batch, size = [], 0
+        batch.append(index)
+        size += len(texts[index])
+    if batch:
+        yield batch
@@ -0,0 +1,46 @@
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import IO, Iterator, List, Union
+
+W: str = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def paragraph_texts(docx: Union[str, IO[bytes]]) -> Iterator[str]:
+    """Yields the text of every paragraph in the body of a docx file, the same texts
+    as paragraph.text of the paragraphs of a python-docx Document.
+
+    Only word/document.xml is read from the zip file and it is parsed while it is
+    being decompressed. Every paragraph is dropped from the tree as soon as its text
+    has been read, so the whole document is never held in memory. Raises
+    zipfile.BadZipFile, KeyError or ET.ParseError when the file is not a docx file.
+
+    """
+    with zipfile.ZipFile(docx) as archive, archive.open("word/document.xml") as xml:
+        stack: List[ET.Element] = []
+        for event, element in ET.iterparse(xml, events=("start", "end")):
+            if event == "start":
+                stack.append(element)
+                continue
+
+            stack.pop()
+            if len(stack) != 2 or stack[-1].tag != W + "body":
+                continue
+            # A direct child of the body, like python-docx only paragraphs at this
+            # level are part of the document and tables are skipped.
+            if element.tag == W + "p":
+                yield _paragraph_text(element)
+            stack[-1].remove(element)
+
+
+def _paragraph_text(paragraph: ET.Element) -> str:
+    """Text of the runs directly under the paragraph, tabs and line breaks included."""
+    text: List[str] = []
+    for run in paragraph.iterfind(W + "r"):
+        for child in run:
+            if child.tag == W + "t":
+                text.append(child.text or "")
+            elif child.tag == W + "tab":
+                text.append("\t")
+            elif child.tag in (W + "br", W + "cr"):
+                text.append("\n")
+    return "".join(text)
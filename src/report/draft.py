@@ -0,0 +1,173 @@
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional, Pattern, Sequence, Set, Tuple
+
+from docx import Document
+
+# Splits a sentence of the draft into words, numbers and punctuation, close to how
+# Sparv tokenizes it.
+TOKEN_REGEX: Pattern[str] = re.compile(r"\d+(?:[.:,]\d+)*|\w+(?:[-']\w+)*|[^\w\s]")
+
+
+class DraftWord:
+    """A word of the draft and its position in the text of the draft. It has no
+    baseform, only Sparv knows it."""
+
+    def __init__(self, text: str, start: int) -> None:
+        self.text: str = text
+        self.position: Tuple[int, int] = (start, start + len(text))
+        self.baseform: Tuple[str, ...] = ()
+
+
+class DraftHeadline:
+    """A headline and the sentences under it, as found in the document."""
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.sentences: List[str] = []
+
+
+class ReportDraft:
+    """The structure of a report read directly from the docx document.
+
+    The draft has the same headlines, sentences and text as the report will have once
+    it has been annotated by Sparv, so everything that only needs the text can be done
+    with the draft while waiting for Sparv.
+
+    """
+
+    def __init__(
+        self,
+        document: Optional[Document] = None,
+        paragraphs: Optional[Iterable[str]] = None,
+    ) -> None:
+        """The draft is read from the paragraphs of the python-docx document, or from
+        the texts of the paragraphs if they are given, as read by
+        docx_text.paragraph_texts()."""
+        self.document: Optional[Document] = document
+        self.headlines: List[DraftHeadline] = []
+        # Number of paragraphs in the document, empty ones included.
+        self.paragraph_count: int = 0
+
+        if paragraphs is None:
+            if document is None:
+                raise Exception("ReportDraft needs a document or its paragraphs.")
+            paragraphs = (paragraph.text for paragraph in document.paragraphs)
+
+        current_headline: DraftHeadline
+        for paragraph in paragraphs:
+            self.paragraph_count += 1
+            text: str = paragraph.strip()
+            # Is it a headline or just text
+            if re.match(r"(^\w+\s?\/?\w+\s?\/?\w+\s?\/?\:?$)", text) and text.isupper():
+                current_headline = DraftHeadline(text)
+                self.headlines.append(current_headline)
+            elif self.headlines and text:
+                # Split sentences
+                for sentence in split_and_keep_delimiter(text, ". "):
+                    if not sentence:
+                        continue
+                    elif sentence[-1] == " ":
+                        sentence = sentence[:-1]
+                    current_headline.sentences.append(sentence)
+
+        layout: List[Tuple[int, List[int]]]
+        self._text, layout = layout_text(
+            [(headline.name, headline.sentences) for headline in self.headlines]
+        )
+        self._spans: Dict[DraftHeadline, Tuple[int, int]] = {
+            headline: (start, start + len(headline.name))
+            for headline, (start, _) in zip(self.headlines, layout)
+        }
+        self._layout: List[Tuple[int, List[int]]] = layout
+        self._words: Optional[List[DraftWord]] = None
+
+    def get_headline_position(self, headline: DraftHeadline) -> Tuple[int, int]:
+        """Returns the start and end postion of the headline, not its sub text."""
+        return self._spans.get(headline, (0, 0))
+
+    def get_tokens(self) -> List[DraftWord]:
+        """Every word and punctuation mark of the sentences, excluding headline titles,
+        in the same order as the words of the report. Tokenized once."""
+        if self._words is None:
+            self._words = [
+                DraftWord(match.group(), position + match.start())
+                for headline, (_, positions) in zip(self.headlines, self._layout)
+                for sentence, position in zip(headline.sentences, positions)
+                for match in TOKEN_REGEX.finditer(sentence)
+            ]
+        return self._words
+
+    def get_words(self) -> Set[str]:
+        """Words in the text as a simple tokenizer sees them. Sparv may split the text
+        differently."""
+        return set(re.findall(r"\w+(?:[-']\w+)*", self._text))
+
+    def to_text(self) -> str:
+        return self._text
+
+    def to_xml(self) -> str:
+        """Convert the draft to an XML object and return it as a string. This
+        document is only useful when sent to the Sparv API with our custom
+        configuration.
+        """
+        root_node = ET.Element("text", attrib={"title": "Anmälan"})
+        root_node.extend(self._section_nodes())
+        return ET.tostring(root_node, encoding="unicode")
+
+    def to_sections(self) -> List[str]:
+        """The paragraph node of every headline in to_xml() as a string of its own, so
+        the sections can be annotated and cached separately."""
+        return [ET.tostring(node, encoding="unicode") for node in self._section_nodes()]
+
+    def _section_nodes(self) -> List[ET.Element]:
+        nodes: List[ET.Element] = []
+        for headline in self.headlines:
+            headline_node = ET.Element("paragraph", attrib={"name": headline.name})
+            for sentence in headline.sentences:
+                sentence_node = ET.SubElement(
+                    headline_node, "sentence", attrib={"original": sentence}
+                )
+                sentence_node.text = sentence
+            nodes.append(headline_node)
+        return nodes
+
+
+def split_and_keep_delimiter(s: str, sep: str) -> List[str]:
+    parts: List[str] = s.split(sep)
+    return [part + sep for part in parts[:-1]] + parts[-1:]
+
+
+def layout_text(
+    headlines: Sequence[Tuple[str, Sequence[str]]]
+) -> Tuple[str, List[Tuple[int, List[int]]]]:
+    """Lay out the headlines and their sentences as text, the same way as
+    Headline.to_text() joined by blank lines. Returns the text together with the start
+    position of every headline and of every sentence under it."""
+    texts: List[str] = []
+    layout: List[Tuple[int, List[int]]] = []
+    offset: int = 0
+
+    for name, sentences in headlines:
+        raw: str = f"{name}\n" + "".join(sentence + " " for sentence in sentences)
+        text: str = raw.strip()
+        start: int = offset - (len(raw) - len(raw.lstrip()))
+
+        positions: List[int] = []
+        position: int = start + len(name) + 1
+        for sentence in sentences:
+            positions.append(position)
+            position += len(sentence) + 1
+
+        layout.append((start, positions))
+        texts.append(text)
+        offset += len(text) + 2
+
+    joined: str = "\n\n".join(texts)
+    lead: int = len(joined) - len(joined.lstrip())
+    if lead:
+        layout = [
+            (start - lead, [position - lead for position in positions])
+            for start, positions in layout
+        ]
+    return joined.strip(), layout
@@ -2,18 +2,40 @@ import xml.etree.ElementTree as ET
 from typing import List, Optional
 
 from src.report.sentence import Sentence
-from src.report.named_entity import NamedEntity
+from src.report.named_entity import NamedEntity, NamedEntityIndex
+from src.report.readability import Readability
+from src.report.word import TokenStore
 
 
 class Headline:
     """Represents a headline from a report."""
 
-    def __init__(self, headline_node: ET.Element) -> None:
+    def __init__(
+        self,
+        headline_node: ET.Element,
+        sentences: Optional[List[Sentence]] = None,
+        store: Optional[TokenStore] = None,
+    ) -> None:
+        """The sentences are read from the headline node unless they are given, their
+        words are added to the store."""
         self.name: str = headline_node.attrib["name"]
         self.sentences: List[Sentence] = []
 
-        for sentence_node in headline_node:
-            self.sentences.append(Sentence(sentence_node))
+        if sentences is not None:
+            self.sentences = sentences
+        else:
+            for sentence_node in headline_node:
+                self.sentences.append(Sentence(sentence_node, store))
+
+        self.named_entities: NamedEntityIndex = NamedEntityIndex(
+            named_entity
+            for sentence in self.sentences
+            for named_entity in sentence.named_entities
+        )
+        self.readability: Readability = Readability.count(
+            [(word.text, word.wordclass) for word in sentence.words]
+            for sentence in self.sentences
+        )
 
     def get_named_entities(
         self,
@@ -23,22 +45,13 @@ class Headline:
     ) -> List[NamedEntity]:
         """Returns a list of named entities from the text under the headline that matches the
         specifications."""
-        found: List[NamedEntity] = []
-        for named_entity in [e for s in self.sentences for e in s.named_entities]:
-            if identity and (identity != named_entity.identity):
-                continue
-            if type and (type != named_entity.type):
-                continue
-            if subtype and (subtype != named_entity.subtype):
-                continue
-            found.append(named_entity)
-        return found
+        return self.named_entities.get(identity, type, subtype)
 
     def has_named_entity(
         self, identity: str, type: Optional[str] = None, subtype: Optional[str] = None
     ) -> bool:
         """If the specified entity exists in the text under the headline."""
-        if len(self.get_named_entities(identity, type, subtype)) > 0:
+        if self.named_entities.get(identity, type, subtype):
             return True
         return False
 
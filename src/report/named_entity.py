@@ -1,17 +1,61 @@
 import xml.etree.ElementTree as ET
-from typing import List
-from src.report.word import Word
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.report.word import TokenStore, Word
 
 
 class NamedEntity:
     """Represents a named entity, more information at:
     http://www.lrec-conf.org/proceedings/lrec2014/pdf/391_Paper.pdf
     """
-    def __init__(self, named_entity_node: ET.Element):
+    def __init__(
+        self, named_entity_node: ET.Element, store: Optional[TokenStore] = None
+    ):
         self.identity: str = named_entity_node.attrib["ex"]
         self.type: str = named_entity_node.attrib["type"]
         self.subtype: str = named_entity_node.attrib["subtype"]
         self.words: List[Word] = []
+        if store is None:
+            store = TokenStore()
 
         for word_node in named_entity_node:
-            self.words.append(Word(word_node))
+            self.words.append(store.add(word_node))
+        self.text: str = " ".join([w.text for w in self.words])
+
+
+class NamedEntityIndex:
+    """Finds named entities by identity, type and subtype with one dict lookup.
+
+    Every entity is indexed under all eight combinations of its identity, type and
+    subtype where any of them can be left out, so every query that get() accepts is
+    a key in the index.
+
+    """
+
+    def __init__(self, named_entities: Iterable[NamedEntity]) -> None:
+        self._index: Dict[
+            Tuple[Optional[str], Optional[str], Optional[str]], List[NamedEntity]
+        ] = {}
+        for named_entity in named_entities:
+            for key in product(
+                (named_entity.identity, None),
+                (named_entity.type, None),
+                (named_entity.subtype, None),
+            ):
+                self._index.setdefault(key, []).append(named_entity)
+
+    def get(
+        self,
+        identity: Optional[str] = None,
+        type: Optional[str] = None,
+        subtype: Optional[str] = None,
+    ) -> List[NamedEntity]:
+        """The named entities that match, in the order they were indexed. Empty values
+        match any entity."""
+        key: Tuple[Optional[str], Optional[str], Optional[str]] = (
+            identity or None,
+            type or None,
+            subtype or None,
+        )
+        return list(self._index.get(key, []))
@@ -0,0 +1,98 @@
+import math
+from typing import FrozenSet, Iterable, Optional, Sequence, Set, Tuple
+
+# A token as (word, part of speech).
+Token = Tuple[str, str]
+
+# Parts of speech that are punctuation and not counted as words.
+PUNCTUATION: FrozenSet[str] = frozenset({"MAD", "MID", "PAD"})
+# Nouns, prepositions and participles.
+NOMINAL: FrozenSet[str] = frozenset({"NN", "PP", "PC"})
+# Pronouns, adverbs and verbs.
+VERBAL: FrozenSet[str] = frozenset({"PN", "AB", "VB"})
+
+
+class Readability:
+    """The counts behind the readability metrics LIX, OVIX and NK, computed the same
+    way as Sparv does.
+
+    The tokens are counted once and the metrics are derived from the counts. Counts
+    for parts of a text can be added together, so the metrics of a whole report are
+    computed from the counts of its headlines.
+
+    """
+
+    def __init__(
+        self,
+        sentences: int = 0,
+        words: int = 0,
+        long_words: int = 0,
+        nominal: int = 0,
+        verbal: int = 0,
+        types: Optional[Set[str]] = None,
+    ) -> None:
+        self.sentences: int = sentences
+        self.words: int = words
+        self.long_words: int = long_words
+        self.nominal: int = nominal
+        self.verbal: int = verbal
+        self.types: Set[str] = types if types is not None else set()
+
+    @classmethod
+    def count(cls, sentences: Iterable[Sequence[Token]]) -> "Readability":
+        counts: Readability = cls()
+        for sentence in sentences:
+            counts.sentences += 1
+            for word, pos in sentence:
+                if pos in NOMINAL:
+                    counts.nominal += 1
+                elif pos in VERBAL:
+                    counts.verbal += 1
+                if pos in PUNCTUATION:
+                    continue
+                counts.words += 1
+                if len(word) > 6:
+                    counts.long_words += 1
+                counts.types.add(word.lower())
+        return counts
+
+    def __add__(self, other: "Readability") -> "Readability":
+        return Readability(
+            self.sentences + other.sentences,
+            self.words + other.words,
+            self.long_words + other.long_words,
+            self.nominal + other.nominal,
+            self.verbal + other.verbal,
+            self.types | other.types,
+        )
+
+    @property
+    def lix(self) -> float:
+        """Läsbarhetsindex, the average number of words per sentence plus the
+        percentage of words longer than six characters."""
+        if not self.words:
+            return 0.0
+        return round(
+            self.words / self.sentences + 100 * self.long_words / self.words, 2
+        )
+
+    @property
+    def ovix(self) -> float:
+        """Ordvariationsindex, the variation of the vocabulary independent of the
+        length of the text."""
+        try:
+            return round(
+                math.log(self.words)
+                / math.log(2 - math.log(len(self.types)) / math.log(self.words)),
+                2,
+            )
+        except (ValueError, ZeroDivisionError):
+            return 0.0
+
+    @property
+    def nk(self) -> float:
+        """Nominalkvot, the number of nominal words divided by the number of verbal
+        words."""
+        if not self.verbal:
+            return 0.0
+        return round(self.nominal / self.verbal, 2)
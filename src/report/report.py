@@ -1,123 +1,256 @@
-import tempfile
-import subprocess
 import json
+import math
 import re
 import xml.etree.ElementTree as ET
-from functools import reduce
-from typing import List, Match, Optional, Tuple, Dict, IO, Any, Iterator
+from array import array
+from concurrent.futures import Future
+from typing import (
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Match,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    Union,
+)
 
-import requests
 from docx import Document
 
+from src.report.annotation_builder import AnnotationBuilder
+from src.report.annotation_cache import ANNOTATION_CACHE, AnnotationCache
+from src.report.draft import ReportDraft, layout_text
 from src.report.headline import Headline
-from src.report.word import Word
-from src.report.named_entity import NamedEntity
+from src.report.sentence import Sentence
+from src.report.readability import Readability
+from src.report.sparv_client import SPARV_CLIENT, SparvClient, SparvError
+from src.report.stava import (
+    SPELLING_CACHE,
+    STAVA_POOL,
+    SpellingCache,
+    StavaPool,
+    check_words,
+)
+from src.report.word import TokenStore, Word
+from src.report.named_entity import NamedEntity, NamedEntityIndex
+
+Span = Tuple[int, int]
+
+# Every attribute Sparv can add to the words, grouped the way the settings list them.
+SPARV_ATTRIBUTES: Dict[str, Tuple[str, ...]] = {
+    "lexical_attributes": ("pos", "msd", "lemma", "lex", "sense"),
+    "compound_attributes": ("complemgram", "compwf"),
+    "dependency_attributes": ("ref", "dephead", "deprel"),
+    "sentiment": ("sentiment", "sentimentclass"),
+}
+# Attributes of the named entities, they are only found if one of them is asked for.
+NAMED_ENTITY_ATTRIBUTES: Tuple[str, ...] = ("ex", "type", "subtype")
+
+
+def sparv_settings(attributes: Collection[str]) -> str:
+    """Sparv settings that only ask for the given word and named entity attributes.
+    Every attribute left out saves Sparv work and makes the response smaller."""
+    return json.dumps(
+        {
+            "corpus": "untitled",
+            "lang": "sv",
+            "textmode": "xml",
+            "word_segmenter": "default_tokenizer",
+            "sentence_segmentation": {
+                "tag": "sentence",
+                "attributes": ["original"],
+            },
+            "paragraph_segmentation": {"tag": "paragraph", "attributes": ["name"]},
+            "root": {"tag": "text", "attributes": ["title"]},
+            "extra_tags": [],
+            "positional_attributes": {
+                group: [name for name in names if name in attributes]
+                for group, names in SPARV_ATTRIBUTES.items()
+            },
+            "named_entity_recognition": [
+                name for name in NAMED_ENTITY_ATTRIBUTES if name in attributes
+            ],
+            "text_attributes": {},
+        }
+    )
+
+
+# Settings with every attribute the report can read. The analyzer asks for a smaller
+# profile with only the attributes its tests read, see sparv_settings().
+SPARV_SETTINGS: str = sparv_settings(
+    [name for names in SPARV_ATTRIBUTES.values() for name in names]
+    + list(NAMED_ENTITY_ATTRIBUTES)
+)
 
 
 class Report:
     """Represents a report. It gets most of its attributes from the Sparv API that
-    it calls during initialization.
+    it calls during initialization, unless the annotation from Sparv is given.
 
     """
 
-    def __init__(self, document: Document) -> None:
-        self.document: Document = document
+    def __init__(
+        self,
+        document: Optional[Document],
+        cache: Optional[AnnotationCache] = ANNOTATION_CACHE,
+        sparv: SparvClient = SPARV_CLIENT,
+        stava: StavaPool = STAVA_POOL,
+        spelling_cache: Optional[SpellingCache] = SPELLING_CACHE,
+        annotation: Optional[ET.Element] = None,
+        draft: Optional[ReportDraft] = None,
+        spelling: Optional["Future[Dict[str, Optional[List[str]]]]"] = None,
+        settings: str = SPARV_SETTINGS,
+    ) -> None:
+        self.document: Optional[Document] = document
+        self.draft: ReportDraft = draft if draft is not None else ReportDraft(document)
+        # Spelling verdicts for the words in the draft that are being checked while
+        # the report is annotated.
+        self.spelling: Optional["Future[Dict[str, Optional[List[str]]]]"] = spelling
+        self.cache: Optional[AnnotationCache] = cache
+        self.sparv: SparvClient = sparv
+        self.stava: StavaPool = stava
+        self.spelling_cache: Optional[SpellingCache] = spelling_cache
+        # The Sparv settings decide which attributes the words get.
+        self.settings: str = settings
 
         self.headlines: List[Headline] = []
-        root_node: ET.Element = self._sparv_get_analysis()
-        text_node: Optional[ET.Element] = root_node.find("corpus/text")
-        if not text_node:
+        # Every word of the report, in the order they were parsed.
+        self.tokens: TokenStore = TokenStore()
+        self._words: List[Word] = []
+        self._text: str = ""
+        self._spans: Dict[Union[Headline, Sentence, NamedEntity, Word], Span] = {}
+        if annotation is None:
+            self.headlines = self._sparv_get_analysis()
+        else:
+            text_node: Optional[ET.Element] = annotation.find("corpus/text")
+            if text_node:
+                for headline_node in text_node:
+                    self.headlines.append(
+                        Headline(headline_node, store=self.tokens)
+                    )
+        self.named_entities: NamedEntityIndex = NamedEntityIndex(
+            named_entity
+            for headline in self.headlines
+            for sentence in headline.sentences
+            for named_entity in sentence.named_entities
+        )
+        if not self.headlines:
             return
             # raise Exception("Could not find corpus/text node")
+        self._words = [
+            word
+            for headline in self.headlines
+            for sentence in headline.sentences
+            for word in sentence.words
+        ]
+        self._index_positions()
+
+        self.readability: Readability = sum(
+            (headline.readability for headline in self.headlines), Readability()
+        )
+        self.lix: float = self.readability.lix
+        self.ovix: float = self.readability.ovix
+        self.nk: float = self.readability.nk
 
-        for headline_node in text_node:
-            self.headlines.append(Headline(headline_node))
+    def _index_positions(self) -> None:
+        """Build the textual representation of the report and record the start and end
+        position of every headline, sentence, named entity and word in it."""
+        layout: List[Tuple[int, List[int]]]
+        self._text, layout = layout_text(
+            [
+                (headline.name, [sentence.text for sentence in headline.sentences])
+                for headline in self.headlines
+            ]
+        )
 
-        self.lix: float = float(text_node.attrib["lix"])
-        self.ovix: float = float(text_node.attrib["ovix"])
-        self.nk: float = float(text_node.attrib["nk"])
+        for headline, (start, positions) in zip(self.headlines, layout):
+            self._spans[headline] = (start, start + len(headline.name))
+            for sentence, position in zip(headline.sentences, positions):
+                self._spans[sentence] = (position, position + len(sentence.text))
+                cursor: int = 0
+                for word in sentence.words:
+                    found: int = sentence.text.find(word.text, cursor)
+                    if found == -1:
+                        # Sparv changed the token, keep the best guess in place.
+                        found = cursor
+                    else:
+                        cursor = found + len(word.text)
+                    self._spans[word] = (position + found, position + cursor)
+                for named_entity in sentence.named_entities:
+                    if named_entity.words:
+                        self._spans[named_entity] = (
+                            self._spans[named_entity.words[0]][0],
+                            self._spans[named_entity.words[-1]][1],
+                        )
 
     def _sparv_convert_document_to_xml(self) -> str:
         """Convert the document to an XML object and return it as a string. This
         document is only useful when sent to the Sparv API with our custom
         configuration.
         """
+        return self.draft.to_xml()
 
-        def split_and_keep_delimiter(s: str, sep: str) -> List[str]:
-            return reduce(
-                lambda acc, elem: acc[:-1] + [acc[-1] + elem]
-                if elem == sep
-                else acc + [elem],
-                re.split("(%s)" % re.escape(sep), s),
-                [],
+    def _sparv_get_analysis(self) -> List[Headline]:
+        """Fetches analysis about the report from the Sparv API and returns the
+        headlines of the report. Annotations are cached per section, a whole document
+        is only looked up in the cache for reports cached by batch.create_reports()."""
+        if self.cache is not None:
+            text: str = self._sparv_convert_document_to_xml()
+            cached: Optional[str] = self.cache.get(
+                AnnotationCache.key(text, self.settings)
             )
+            if cached is not None:
+                builder: AnnotationBuilder = AnnotationBuilder(self.tokens)
+                builder.feed(cached)
+                return builder.close()
+        return self._sparv_annotate_sections()
+
+    def _sparv_annotate_sections(self) -> List[Headline]:
+        """Annotate the report one headline section at a time. Every section is cached
+        on its own text, so a resubmitted document is never sent to Sparv again and
+        when it has a few edits only the edited sections are sent. The response is
+        parsed while it is being read."""
+        sections: List[str] = self.draft.to_sections()
+        keys: List[str] = [section_key(section, self.settings) for section in sections]
+        headlines: List[Optional[Headline]] = [None] * len(sections)
+        if self.cache is not None:
+            for index, key in enumerate(keys):
+                cached: Optional[str] = self.cache.get(key)
+                if cached is not None:
+                    builder: AnnotationBuilder = AnnotationBuilder(self.tokens)
+                    builder.feed(cached)
+                    headlines[index] = builder.close()[0]
+
+        missing: List[int] = [i for i, node in enumerate(headlines) if node is None]
+
+        def cache_section(position: int, headline: Headline, section: str) -> None:
+            # Only cache sections that line up with the sections that were sent.
+            if self.cache is None or position >= len(missing):
+                return
+            if headline.name == self.draft.headlines[missing[position]].name:
+                self.cache.set(keys[missing[position]], section)
 
-        root_node = ET.Element("text", attrib={"title": "Anmälan"})
-        current_headline: Optional[ET.Element] = None
-        for paragraph in self.document.paragraphs:
-            text: str = paragraph.text.strip()
-            # Is it a headline or just text
-            if re.match(r"(^\w+\s?\/?\w+\s?\/?\w+\s?\/?\:?$)", text) and text.isupper():
-                current_headline = ET.SubElement(
-                    root_node, "paragraph", attrib={"name": text}
+        if missing:
+            builder = AnnotationBuilder(self.tokens, on_section=cache_section)
+            for chunk in self.sparv.annotate_stream(
+                '<text title="Anmälan">'
+                + "".join(sections[index] for index in missing)
+                + "</text>",
+                self.settings,
+            ):
+                builder.feed(chunk)
+            builder.close()
+            if len(builder.headlines) != len(missing):
+                raise SparvError(
+                    f"Sparv returned {len(builder.headlines)} sections of "
+                    f"{len(missing)}"
                 )
-            elif current_headline is not None and text:
-                # Split sentences
-                for sentence in split_and_keep_delimiter(text, ". "):
-                    if not sentence:
-                        continue
-                    elif sentence[-1] == " ":
-                        sentence = sentence[:-1]
-                    sentence_node = ET.SubElement(
-                        current_headline, "sentence", attrib={"original": sentence}
-                    )
-                    sentence_node.text = sentence
-
-        return ET.tostring(root_node, encoding="unicode")
-
-    def _sparv_get_analysis(self) -> ET.Element:
-        """Fetches analysis about the report from the Sparv API and returns it as an
-        XML object.
-        Current setting are hashed at:
-        https://spraakbanken.gu.se/sparv/#advanced=false&hash=
-        fccea59f54ed3a21859449b148368f9e4cb5f5af&input=xml&lang=sv&language=sv
-        Change hash if updating settings variable."""
-        settings: str = json.dumps(
-            {
-                "corpus": "untitled",
-                "lang": "sv",
-                "textmode": "xml",
-                "word_segmenter": "default_tokenizer",
-                "sentence_segmentation": {
-                    "tag": "sentence",
-                    "attributes": ["original"],
-                },
-                "paragraph_segmentation": {"tag": "paragraph", "attributes": ["name"]},
-                "root": {"tag": "text", "attributes": ["title"]},
-                "extra_tags": [],
-                "positional_attributes": {
-                    "lexical_attributes": ["pos", "msd", "lemma", "lex", "sense"],
-                    "compound_attributes": ["complemgram", "compwf"],
-                    "dependency_attributes": ["ref", "dephead", "deprel"],
-                    "sentiment": ["sentiment", "sentimentclass"],
-                },
-                "named_entity_recognition": ["ex", "type", "subtype"],
-                "text_attributes": {"readability_metrics": ["lix", "ovix", "nk"]},
-            }
-        )
-        response: requests.models.Response = requests.get(
-            "https://ws.spraakbanken.gu.se/ws/sparv/v2/",
-            data={
-                "text": self._sparv_convert_document_to_xml(),
-                "mode": "xml",
-                "settings": settings,
-            },
-        )
-        if response.status_code == 200:
-            sparv_data: str = response.text.strip()
-            return ET.fromstring(sparv_data)
+            for index, headline in zip(missing, builder.headlines):
+                headlines[index] = headline
 
-        raise Exception(f"Sparv returned unexpected code: {response.status_code}")
+        return [headline for headline in headlines if headline]
 
     def get_named_entities(
         self,
@@ -127,18 +260,7 @@ class Report:
     ) -> List[NamedEntity]:
         """Returns a list of named entities from the report that matches the
         specifications."""
-        found: List[NamedEntity] = []
-        for named_entity in [
-            e for h in self.headlines for s in h.sentences for e in s.named_entities
-        ]:
-            if identity and (identity != named_entity.identity):
-                continue
-            if type and (type != named_entity.type):
-                continue
-            if subtype and (subtype != named_entity.subtype):
-                continue
-            found.append(named_entity)
-        return found
+        return self.named_entities.get(identity, type, subtype)
 
     def get_regex_position(self, regex) -> Tuple[int, int]:
         """Returns the start and end position of the first match of regex."""
@@ -148,11 +270,14 @@ class Report:
         return 0, 0
 
     def get_regex_postions(
-        self, regex: str, ignore_case: bool = False
+        self, regex: Union[str, Pattern[str]], ignore_case: bool = False
     ) -> List[Tuple[int, int]]:
-        """Returns the start and end postions of all found regex matches."""
+        """Returns the start and end postions of all found regex matches. A compiled
+        regex is used with the flags it was compiled with."""
         matches: Iterator[Match[str]]
-        if ignore_case:
+        if isinstance(regex, re.Pattern):
+            matches = regex.finditer(self.to_text())
+        elif ignore_case:
             matches = re.finditer(regex, self.to_text(), re.I)
         else:
             matches = re.finditer(regex, self.to_text())
@@ -160,20 +285,19 @@ class Report:
 
     def get_headline_position(self, headline: Headline) -> Tuple[int, int]:
         """Returns the start and end postion of the headline, not its sub text."""
-        return self.get_regex_position(headline.name)
+        return self._spans.get(headline, (0, 0))
 
-    def get_word_postion(self, word: Word) -> Tuple[int, int]:
-        """Get start and end position of the word in the report."""
-        text: str = self.to_text()
-        words: List[Word] = self.get_words()
-        current_position: int = 0
+    def get_sentence_position(self, sentence: Sentence) -> Tuple[int, int]:
+        """Get start and end position of the sentence in the report."""
+        return self._spans.get(sentence, (0, 0))
 
-        for w in words:
-            current_position = text.find(w.text, current_position)
+    def get_named_entity_position(self, named_entity: NamedEntity) -> Tuple[int, int]:
+        """Get start and end position of the named entity in the report."""
+        return self._spans.get(named_entity, (0, 0))
 
-            if w == word:
-                return (current_position, current_position + len(w.text))
-        return 0, 0
+    def get_word_postion(self, word: Word) -> Tuple[int, int]:
+        """Get start and end position of the word in the report."""
+        return self._spans.get(word, (0, 0))
 
     def get_words_position(self, words: List[Word]) -> Tuple[int, int]:
         """Get start position of the first word and end position of the last word. Useful when
@@ -182,49 +306,74 @@ class Report:
         end: int = self.get_word_postion(words[-1])[1]
         return start, end
 
-    def get_words(self, skip_wordclasses: List[str] = []) -> List[Word]:
-        """Get all words in the report, excluding headline titles."""
-        return [
-            word
-            for headline in self.headlines
-            for sentence in headline.sentences
-            for word in sentence.words
-            if word.wordclass not in skip_wordclasses
-        ]
+    def get_words(self, skip_wordclasses: Collection[str] = ()) -> List[Word]:
+        """Get all words in the report, excluding headline titles. The word classes are
+        compared by their codes in the token store."""
+        if not skip_wordclasses:
+            return list(self._words)
+        skipped: Set[int] = self.tokens.codes(skip_wordclasses)
+        wordclasses: "array[int]" = self.tokens.wordclass
+        return [word for word in self._words if wordclasses[word.index] not in skipped]
 
-    def spellcheck(self, skip_wordclasses: List[str]) -> Dict[Word, List[str]]:
+    def get_sentiment(self) -> float:
+        """The sum of the sentiment of all words in the report."""
+        return math.fsum(self.tokens.sentiment)
+
+    def spellcheck(self, skip_wordclasses: Collection[str]) -> Dict[Word, List[str]]:
         """Run the stava spellchecker and return a list of incorrectly spelled word objects and
         suggestions for alternative spellings."""
-        # open temp file to store text
-        file: IO[Any] = tempfile.NamedTemporaryFile(delete=False)
-        file.write(self.to_text().encode("utf-8"))
-        tmp_path: str = file.name
-        file.close()
-
-        # run stava on temp file and parse the output
-        args = [
-            "stava",
-            "-r",  # include corrections
-            "-f",  # include abbreviations
-            "-n",  # include common names
-            tmp_path,
-        ]
-        output = subprocess.run(args, stdout=subprocess.PIPE)
-        stava_results: Dict[Word, List[str]] = {}
-        for line in output.stdout.decode("utf-8").split("\n"):
-            match: Optional[Match] = re.match(r"^(.+): (.+)$", line)
-            if match and "?" in match.group(2):
-                stava_results[match.group(1)] = []
-            elif match:
-                stava_results[match.group(1)] = match.group(2).split(" ")
+        words: Dict[str, List[Word]] = {}
+        for word in self.get_words(skip_wordclasses):
+            words.setdefault(word.text, []).append(word)
+
+        # use the verdicts checked while waiting for Sparv, check the rest now
+        verdicts: Dict[str, Optional[List[str]]] = {}
+        if self.spelling is not None:
+            prefetched: Dict[str, Optional[List[str]]] = self.spelling.result()
+            verdicts = {text: prefetched[text] for text in words if text in prefetched}
+        verdicts.update(
+            check_words(
+                [text for text in words if text not in verdicts],
+                skip_wordclasses,
+                self.stava,
+                self.spelling_cache,
+            )
+        )
 
         # link word objects to errors and suggestions
         results: Dict[Word, List[str]] = {}
-        for error, corrections in stava_results.items():
-            for word in self.get_words(skip_wordclasses):
-                if word.text == error:
-                    results[word] = corrections
+        for text, corrections in verdicts.items():
+            if corrections is None:
+                continue
+            for word in words[text]:
+                results[word] = corrections
         return results
 
     def to_text(self) -> str:
-        return "\n\n".join([headline.to_text() for headline in self.headlines]).strip()
+        return self._text
+
+
+def section_key(section: str, settings: str) -> str:
+    """The key of the annotation of a section in the annotation cache."""
+    return AnnotationCache.key("section", section, settings)
+
+
+def is_annotation_cached(
+    draft: ReportDraft,
+    settings: str = SPARV_SETTINGS,
+    cache: AnnotationCache = ANNOTATION_CACHE,
+) -> bool:
+    """If the annotation of every section of the draft is cached, so the report can be
+    created without calling Sparv."""
+    return all(
+        cache.contains(section_key(section, settings))
+        for section in draft.to_sections()
+    )
+
+
+def convert_document_to_xml(document: Document) -> str:
+    """Convert the document to an XML object and return it as a string. This
+    document is only useful when sent to the Sparv API with our custom
+    configuration.
+    """
+    return ReportDraft(document).to_xml()
@@ -1,23 +1,29 @@
 import xml.etree.ElementTree as ET
 from typing import List, Optional
 
-from src.report.word import Word
+from src.report.word import TokenStore, Word
 from src.report.named_entity import NamedEntity
 
 
 class Sentence:
     """Represents a sentence from a report."""
 
-    def __init__(self, sentence_node: ET.Element) -> None:
+    def __init__(
+        self, sentence_node: ET.Element, store: Optional[TokenStore] = None
+    ) -> None:
+        """The words are added to the store, a store of its own is used if none is
+        given."""
+        if store is None:
+            store = TokenStore()
         self.words: List[Word] = []
         self.text: str = sentence_node.attrib["original"]
         self.named_entities: List[NamedEntity] = []
 
         for word_node in sentence_node:
             if word_node.tag == "w":
-                self.words.append(Word(word_node))
+                self.words.append(store.add(word_node))
             elif word_node.tag == "ne":
-                self.named_entities.append(NamedEntity(word_node))
+                self.named_entities.append(NamedEntity(word_node, store))
                 self.words += self.named_entities[-1].words
             else:
                 raise Exception(f"Unreqognized tag {word_node.tag}")
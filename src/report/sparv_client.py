@@ -0,0 +1,176 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SPARV_URL: str = "https://ws.spraakbanken.gu.se/ws/sparv/v2/"
+
+
+class SparvError(Exception):
+    """Raised when the Sparv API could not annotate a text."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        Exception.__init__(self, message)
+        self.status_code: Optional[int] = status_code
+
+
+class SparvUnavailable(SparvError):
+    """Raised without calling Sparv when the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stops calls to a failing service for a while.
+
+    The breaker opens after failure_threshold failures in a row. While it is open
+    calls are refused, after reset_timeout seconds a single call is let through to
+    test the service. A success closes the breaker and a failure keeps it open for
+    another reset_timeout seconds.
+
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self._failures: int = 0
+        self._opened_at: Optional[float] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """If calls are refused right now."""
+        with self._lock:
+            return (
+                self._opened_at is not None
+                and time.monotonic() - self._opened_at < self.reset_timeout
+            )
+
+    def allow(self) -> bool:
+        """If a call may be made. Lets one test call through when the breaker has been
+        open for reset_timeout seconds."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._opened_at = time.monotonic()
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class SparvClient:
+    """Client for the Sparv API.
+
+    All requests share one session so connections are kept alive and reused. Every
+    request has a connect and a read timeout. Connection errors, timeouts and server
+    errors are retried with exponential backoff and jitter, other errors fail right
+    away. A circuit breaker stops all calls for a while when Sparv keeps failing.
+    annotate_async() runs requests on a thread pool of the same size as the
+    connection pool, so many annotations can be in flight from one event loop.
+
+    """
+
+    def __init__(
+        self,
+        url: str = SPARV_URL,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        pool_size: int = 10,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.url: str = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.breaker: CircuitBreaker = breaker if breaker else CircuitBreaker()
+
+        self.session: requests.Session = requests.Session()
+        adapter: HTTPAdapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=pool_size)
+
+    def annotate(self, text: str, settings: str) -> str:
+        """Send the XML text to Sparv and return the annotated XML."""
+        return self._post(text, settings, stream=False).text.strip()
+
+    def annotate_stream(
+        self, text: str, settings: str, chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """Same as annotate() but yields the annotated XML in chunks as it arrives, so
+        it can be parsed without holding the whole response in memory. Only failures
+        before the response starts are retried."""
+        response: requests.Response = self._post(text, settings, stream=True)
+        try:
+            yield from response.iter_content(chunk_size)
+        except requests.RequestException as error:
+            raise SparvError(f"Could not read the answer from Sparv: {error}")
+        finally:
+            response.close()
+
+    def _post(self, text: str, settings: str, stream: bool) -> requests.Response:
+        if not self.breaker.allow():
+            raise SparvUnavailable("Sparv is unavailable, try again later")
+        try:
+            response: requests.Response = self._post_with_retries(
+                text, settings, stream
+            )
+        except SparvError as error:
+            if error.status_code is None or error.status_code >= 500:
+                self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return response
+
+    def _post_with_retries(
+        self, text: str, settings: str, stream: bool
+    ) -> requests.Response:
+        error: SparvError = SparvError("Sparv was never called")
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay: float = self.backoff * 2 ** (attempt - 1)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+            try:
+                response: requests.Response = self.session.post(
+                    self.url,
+                    data={"text": text, "mode": "xml", "settings": settings},
+                    timeout=self.timeout,
+                    stream=stream,
+                )
+            except (requests.ConnectionError, requests.Timeout) as request_error:
+                error = SparvError(f"Could not reach Sparv: {request_error}")
+                continue
+
+            if response.status_code == 200:
+                return response
+            response.close()
+            error = SparvError(
+                f"Sparv returned unexpected code: {response.status_code}",
+                response.status_code,
+            )
+            if response.status_code < 500 and response.status_code != 429:
+                break
+        raise error
+
+    async def annotate_async(self, text: str, settings: str) -> str:
+        """Same as annotate() but can be awaited."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self.annotate, text, settings)
+
+
+SPARV_CLIENT: SparvClient = SparvClient()
@@ -0,0 +1,434 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import IO, Any, Collection, Dict, Iterable, List, Match, Optional, Tuple
+
+LOGGER: logging.Logger = logging.getLogger(__name__)
+
+STAVA_ARGS: List[str] = [
+    "stava",
+    "-r",  # include corrections
+    "-f",  # include abbreviations
+    "-n",  # include common names
+]
+
+# Directories with the dictionaries of stava, separated like PATH. A change to any file
+# in them changes the stava version. If not set the lib directory next to stava is used.
+STAVA_DICTIONARIES: List[str] = [
+    path for path in os.environ.get("STAVA_LIB", "").split(os.pathsep) if path
+]
+
+# Makes stdout of a C program line buffered when it writes to a pipe, without it stava
+# buffers its answers in blocks and they never arrive while the process is running.
+LINE_BUFFERED: List[str] = ["stdbuf", "-oL"]
+
+# Nonsense word sent after every text. Stava reports it as misspelled which marks the
+# end of the output for that text. A counter is appended to make every marker unique.
+SENTINEL: str = "xqxstavaslutxqx"
+
+
+class StavaError(Exception):
+    """Raised when the stava spellchecker can not be used."""
+
+
+def parse_line(line: str, results: Dict[str, List[str]]) -> Optional[str]:
+    """Add the misspelled word on a line of stava output and its suggestions to results.
+    Returns the word, or None if the line has no word."""
+    match: Optional[Match] = re.match(r"^(.+): (.+)$", line.rstrip("\n"))
+    if not match:
+        return None
+    if "?" in match.group(2):
+        results[match.group(1)] = []
+    else:
+        results[match.group(1)] = match.group(2).split(" ")
+    return match.group(1)
+
+
+def line_buffered(args: List[str]) -> List[str]:
+    """The command to run args with line buffered stdout, if stdbuf is installed."""
+    if shutil.which(LINE_BUFFERED[0]) is None:
+        return args
+    return LINE_BUFFERED + args
+
+
+class StavaProcess:
+    """A long lived stava process that is fed text over stdin and answers on stdout."""
+
+    def __init__(self, args: List[str]) -> None:
+        self.args: List[str] = args
+        self.started: bool = False
+        self._process: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._count: int = 0
+
+    def start(self) -> None:
+        self.started = True
+        try:
+            process: subprocess.Popen = subprocess.Popen(
+                line_buffered(self.args),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                encoding="utf-8",
+                bufsize=1,
+            )
+        except OSError as error:
+            raise StavaError(f"Could not start stava: {error}")
+        self._process = process
+        self._lines = queue.Queue()
+        threading.Thread(
+            target=self._read, args=(process.stdout, self._lines), daemon=True
+        ).start()
+
+    @staticmethod
+    def _read(stdout: IO[str], lines: "queue.Queue[Optional[str]]") -> None:
+        for line in stdout:
+            lines.put(line)
+        lines.put(None)
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+        try:
+            if self._process.stdin:
+                self._process.stdin.close()
+            self._process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+        self._process = None
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def check(self, text: str, timeout: float) -> Dict[str, List[str]]:
+        """Spellcheck the text and return the misspelled words with suggestions for
+        alternative spellings."""
+        if not self.is_alive():
+            self.restart()
+        stdin: Optional[IO[str]] = self._process.stdin if self._process else None
+        if stdin is None:
+            raise StavaError("Stava is not running")
+
+        self._count += 1
+        sentinel: str = SENTINEL + "".join(
+            chr(ord("a") + int(digit)) for digit in str(self._count)
+        )
+        try:
+            stdin.write(f"{text}\n{sentinel}\n")
+            stdin.flush()
+        except (OSError, ValueError) as error:
+            raise StavaError(f"Could not write to stava: {error}")
+
+        results: Dict[str, List[str]] = {}
+        while True:
+            try:
+                line: Optional[str] = self._lines.get(timeout=timeout)
+            except queue.Empty:
+                raise StavaError("Stava did not answer in time")
+            if line is None:
+                raise StavaError("Stava exited unexpectedly")
+            if parse_line(line, results) == sentinel:
+                del results[sentinel]
+                return results
+
+    def ping(self, timeout: float) -> bool:
+        """Health check, make sure the process answers."""
+        try:
+            self.check("", timeout)
+        except StavaError:
+            return False
+        return True
+
+
+class StavaPool:
+    """A pool of long lived stava processes.
+
+    At most size texts are checked at the same time and at most max_waiting requests
+    wait for a free process, further requests fail right away. A process that crashes
+    or stops answering is restarted and the text is retried once on the new process.
+    If that fails too the text is checked by a stava process of its own, the way it
+    was done before the pool. The processes are started on first use and from then on
+    the idle ones are pinged every health_interval seconds.
+
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        args: List[str] = STAVA_ARGS,
+        timeout: float = 10.0,
+        max_waiting: int = 32,
+        health_interval: float = 60.0,
+        dictionaries: List[str] = STAVA_DICTIONARIES,
+        version_ttl: float = 60.0,
+    ) -> None:
+        self.args: List[str] = args
+        self.dictionaries: List[str] = dictionaries
+        self.version_ttl: float = version_ttl
+        # The version and when it was read.
+        self._version: Optional[Tuple[float, str]] = None
+        self.timeout: float = timeout
+        self.health_interval: float = health_interval
+        self._health_checks: Optional[threading.Thread] = None
+        self._closed: threading.Event = threading.Event()
+        self._processes: List[StavaProcess] = [StavaProcess(args) for _ in range(size)]
+        self._idle: "queue.Queue[StavaProcess]" = queue.Queue()
+        for process in self._processes:
+            self._idle.put(process)
+        self._slots: threading.BoundedSemaphore = threading.BoundedSemaphore(
+            size + max_waiting
+        )
+
+    def check(self, text: str) -> Dict[str, List[str]]:
+        """Spellcheck the text on a free process."""
+        if not self._slots.acquire(blocking=False):
+            raise StavaError("Too many texts are waiting for a spellcheck")
+        self._start_health_checks()
+        try:
+            try:
+                process: StavaProcess = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise StavaError("No stava process became available in time")
+            try:
+                try:
+                    return process.check(text, self.timeout)
+                except StavaError:
+                    try:
+                        process.restart()
+                        return process.check(text, self.timeout)
+                    except StavaError:
+                        return self.check_once(text)
+            finally:
+                self._idle.put(process)
+        finally:
+            self._slots.release()
+
+    def check_once(self, text: str) -> Dict[str, List[str]]:
+        """Spellcheck the text with a new stava process that exits when it is done."""
+        try:
+            output: subprocess.CompletedProcess = subprocess.run(
+                self.args,
+                input=text + "\n",
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                encoding="utf-8",
+                timeout=self.timeout,
+            )
+        except (OSError, subprocess.TimeoutExpired) as error:
+            raise StavaError(f"Could not run stava: {error}")
+        results: Dict[str, List[str]] = {}
+        for line in output.stdout.split("\n"):
+            parse_line(line, results)
+        return results
+
+    def _start_health_checks(self) -> None:
+        if self._health_checks is not None or not self.health_interval:
+            return
+        self._health_checks = threading.Thread(target=self._run_health_checks)
+        self._health_checks.daemon = True
+        self._health_checks.start()
+
+    def _run_health_checks(self) -> None:
+        while not self._closed.wait(self.health_interval):
+            self.health_check()
+
+    def health_check(self) -> int:
+        """Ping the idle processes and restart the ones that do not answer. Returns the
+        number of restarted processes."""
+        restarted: int = 0
+        for _ in range(len(self._processes)):
+            try:
+                process: StavaProcess = self._idle.get(block=False)
+            except queue.Empty:
+                break
+            try:
+                if process.started and not process.ping(self.timeout):
+                    process.restart()
+                    restarted += 1
+            except StavaError:
+                # Could not be restarted, the next check will try again.
+                pass
+            finally:
+                self._idle.put(process)
+        return restarted
+
+    def version(self) -> str:
+        """Identifies the stava installation, changes when stava, its dictionaries or
+        its arguments are updated. The files are only read again after version_ttl
+        seconds."""
+        now: float = time.monotonic()
+        cached: Optional[Tuple[float, str]] = self._version
+        if cached is not None and now - cached[0] < self.version_ttl:
+            return cached[1]
+        version: str = self._read_version()
+        self._version = (now, version)
+        return version
+
+    def _read_version(self) -> str:
+        path: Optional[str] = shutil.which(self.args[0])
+        if path is None:
+            return " ".join(self.args)
+        directories: List[str] = self.dictionaries or [
+            os.path.join(os.path.dirname(os.path.realpath(path)), "lib")
+        ]
+        files: List[str] = [path]
+        for directory in directories:
+            for root, _, names in sorted(os.walk(directory)):
+                files.extend(os.path.join(root, name) for name in sorted(names))
+
+        parts: List[str] = [" ".join(self.args)]
+        for file in files:
+            try:
+                stat: os.stat_result = os.stat(file)
+            except OSError:
+                continue
+            parts.append(f"{file} {stat.st_mtime} {stat.st_size}")
+        return " ".join(parts)
+
+    def close(self) -> None:
+        self._closed.set()
+        for process in self._processes:
+            process.stop()
+
+
+class SpellingCache:
+    """LRU cache with the stava verdict for single words, shared between reports.
+
+    A verdict is None for a correctly spelled word and otherwise the list of
+    suggestions. The cache is emptied when the stava version or the word classes
+    skipped by the spellcheck change. If a path is given the cache is loaded from it
+    and save() writes it back.
+
+    """
+
+    def __init__(self, capacity: int = 200000, path: Optional[str] = None) -> None:
+        self.capacity: int = capacity
+        self.path: Optional[str] = path
+        self.hits: int = 0
+        self.misses: int = 0
+        self._namespace: str = ""
+        self._verdicts: "OrderedDict[str, Optional[List[str]]]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                self.load()
+            except (ValueError, KeyError, TypeError) as error:
+                # A broken cache file must not stop the app from starting.
+                LOGGER.warning("Could not load spelling cache %s: %s", path, error)
+                self._namespace = ""
+                self._verdicts = OrderedDict()
+
+    def use(self, version: str, skip_wordclasses: Collection[str]) -> None:
+        """Make sure the cached verdicts were made with this stava version and list of
+        skipped word classes, otherwise forget them."""
+        namespace: str = json.dumps([version, sorted(skip_wordclasses)])
+        with self._lock:
+            if namespace != self._namespace:
+                self._namespace = namespace
+                self._verdicts.clear()
+
+    def lookup(self, words: Iterable[str]) -> Dict[str, Optional[List[str]]]:
+        """Returns the known verdicts for the words, unknown words are left out."""
+        found: Dict[str, Optional[List[str]]] = {}
+        with self._lock:
+            for word in words:
+                if word in self._verdicts:
+                    self._verdicts.move_to_end(word)
+                    found[word] = self._verdicts[word]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def update(self, verdicts: Dict[str, Optional[List[str]]]) -> None:
+        with self._lock:
+            for word, verdict in verdicts.items():
+                self._verdicts[word] = verdict
+                self._verdicts.move_to_end(word)
+            while len(self._verdicts) > self.capacity:
+                self._verdicts.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and size, useful when tuning the capacity."""
+        lookups: int = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._verdicts),
+            "capacity": self.capacity,
+        }
+
+    def load(self) -> None:
+        if not self.path:
+            return
+        with open(self.path, "r", encoding="utf-8") as file:
+            data: Dict[str, Any] = json.load(file)
+        with self._lock:
+            self._namespace = data["namespace"]
+            self._verdicts = OrderedDict(data["verdicts"])
+
+    def save(self) -> None:
+        """Write the cache to path, the file is replaced atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            data: str = json.dumps(
+                {
+                    "namespace": self._namespace,
+                    "verdicts": list(self._verdicts.items()),
+                },
+                ensure_ascii=False,
+            )
+        directory: str = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def check_words(
+    words: Collection[str],
+    skip_wordclasses: Collection[str],
+    stava: StavaPool,
+    cache: Optional[SpellingCache],
+) -> Dict[str, Optional[List[str]]]:
+    """Returns the stava verdict for every word. Only words that are not in the cache
+    are sent to stava, one per line, and words without letters are never sent."""
+    words = [word for word in words if any(character.isalpha() for character in word)]
+    verdicts: Dict[str, Optional[List[str]]] = {}
+    if cache is not None:
+        cache.use(stava.version(), skip_wordclasses)
+        verdicts = cache.lookup(words)
+
+    unknown: List[str] = [word for word in words if word not in verdicts]
+    if unknown:
+        stava_results: Dict[str, List[str]] = stava.check("\n".join(unknown))
+        checked: Dict[str, Optional[List[str]]] = {
+            word: stava_results.get(word) for word in unknown
+        }
+        if cache is not None:
+            cache.update(checked)
+        verdicts.update(checked)
+    return verdicts
+
+
+STAVA_POOL: StavaPool = StavaPool()
+atexit.register(STAVA_POOL.close)
+
+SPELLING_CACHE: SpellingCache = SpellingCache(path="cache/stava.json")
+atexit.register(SPELLING_CACHE.save)
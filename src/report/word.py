@@ -1,5 +1,73 @@
+import sys
 import xml.etree.ElementTree as ET
-from typing import List
+from array import array
+from typing import Collection, Dict, List, Set, Tuple
+
+
+class TokenStore:
+    """Compact storage of the words of a report, one column per attribute.
+
+    The tag attributes repeat a lot, so they are stored as integer codes into one
+    table of distinct values and the sentiment as a float column. The texts of the
+    words are interned so every occurrence of a word shares one string. A Word is only
+    a view of a row in the store.
+
+    """
+
+    def __init__(self) -> None:
+        self.words: List["Word"] = []
+        self.texts: List[str] = []
+        self.wordclass: "array[int]" = array("I")
+        self.morphosyntax: "array[int]" = array("I")
+        self.attitude: "array[int]" = array("I")
+        self.sentiment: "array[float]" = array("d")
+        self.dependency_relation: "array[int]" = array("I")
+        self.reference: "array[int]" = array("I")
+        self.dependency_head: "array[int]" = array("I")
+        self.baseform: "array[int]" = array("I")
+        self.values: List[str] = []
+        self.baseforms: List[Tuple[str, ...]] = []
+        self._codes: Dict[str, int] = {}
+        self._baseform_codes: Dict[Tuple[str, ...], int] = {}
+
+    def code(self, value: str) -> int:
+        """The code of the value, added to the table if it is not there."""
+        code: int = self._codes.setdefault(value, len(self.values))
+        if code == len(self.values):
+            self.values.append(value)
+        return code
+
+    def codes(self, values: Collection[str]) -> Set[int]:
+        """The codes of the values that are in the table."""
+        return {self._codes[value] for value in values if value in self._codes}
+
+    def add(self, word_node: ET.Element) -> "Word":
+        """Store a word node from Sparv and return the word."""
+        if not isinstance(word_node.text, str):
+            raise Exception("Invalid word node used to initialize instance.")
+        self.texts.append(sys.intern(word_node.text))
+        # Attributes that were not asked for in the Sparv settings are left empty.
+        attributes: Dict[str, str] = word_node.attrib
+        self.wordclass.append(self.code(attributes.get("pos", "")))
+        self.morphosyntax.append(self.code(attributes.get("msd", "")))
+        self.attitude.append(self.code(attributes.get("sentimentclass", "")))
+        sentiment: str = attributes.get("sentiment", "")
+        self.sentiment.append(float(sentiment) if sentiment else 0.0)
+        self.dependency_relation.append(self.code(attributes.get("deprel", "")))
+        self.reference.append(self.code(attributes.get("ref", "")))
+        self.dependency_head.append(self.code(attributes.get("dephead", "")))
+
+        baseform: Tuple[str, ...] = tuple(
+            w for w in attributes.get("lemma", "").split("|") if w
+        )
+        code: int = self._baseform_codes.setdefault(baseform, len(self.baseforms))
+        if code == len(self.baseforms):
+            self.baseforms.append(baseform)
+        self.baseform.append(code)
+
+        word: Word = Word(self, len(self.words))
+        self.words.append(word)
+        return word
 
 
 class Word:
@@ -11,19 +79,44 @@ class Word:
 
     """
 
-    def __init__(self, word_node: ET.Element) -> None:
-        if not isinstance(word_node.text, str):
-            raise Exception("Invalid word node used to initialize instance.")
-        self.text: str = word_node.text
-        self.wordclass: str = word_node.attrib["pos"]
-        self.morphosyntax: str = word_node.attrib["msd"]
-        self.attitude: str = word_node.attrib["sentimentclass"]
-        self.sentiment: float = 0.0
-        if word_node.attrib["sentiment"]:
-            self.sentiment = float(word_node.attrib["sentiment"])
-        self.dependency_relation: str = word_node.attrib["deprel"]
-        self.reference: str = word_node.attrib["ref"]
-        self.dependency_head: str = word_node.attrib["dephead"]
-        self.baseform: List[str] = [
-            w for w in word_node.attrib["lemma"].split("|") if w
-        ]
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: TokenStore, index: int) -> None:
+        self.store: TokenStore = store
+        self.index: int = index
+
+    @property
+    def text(self) -> str:
+        return self.store.texts[self.index]
+
+    @property
+    def wordclass(self) -> str:
+        return self.store.values[self.store.wordclass[self.index]]
+
+    @property
+    def morphosyntax(self) -> str:
+        return self.store.values[self.store.morphosyntax[self.index]]
+
+    @property
+    def attitude(self) -> str:
+        return self.store.values[self.store.attitude[self.index]]
+
+    @property
+    def sentiment(self) -> float:
+        return self.store.sentiment[self.index]
+
+    @property
+    def dependency_relation(self) -> str:
+        return self.store.values[self.store.dependency_relation[self.index]]
+
+    @property
+    def reference(self) -> str:
+        return self.store.values[self.store.reference[self.index]]
+
+    @property
+    def dependency_head(self) -> str:
+        return self.store.values[self.store.dependency_head[self.index]]
+
+    @property
+    def baseform(self) -> Tuple[str, ...]:
+        return self.store.baseforms[self.store.baseform[self.index]]
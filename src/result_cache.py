@@ -0,0 +1,82 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResultCache:
+    """In memory LRU cache for finished analyses.
+
+    The key is made from the uploaded document together with everything else the
+    result depends on, like the rules and the stava version, so a change to any of
+    them results in a new entry. Entries older than max_age seconds are dropped and
+    the least recently used entries are evicted when the cached results take up more
+    than max_size bytes as JSON.
+
+    """
+
+    def __init__(
+        self, max_size: int = 64 * 1024 * 1024, max_age: float = 60 * 60
+    ) -> None:
+        self.max_size: int = max_size
+        self.max_age: float = max_age
+        self.hits: int = 0
+        self.misses: int = 0
+        self._size: int = 0
+        # key -> (time added, size, result)
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = (
+            OrderedDict()
+        )
+        self._lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def key(content: bytes, *parts: str) -> str:
+        """Create a cache key from the document and what the analysis depends on."""
+        digest = hashlib.sha256(content)
+        for part in parts:
+            digest.update(b"\0")
+            digest.update(part.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for key or None. The result is shared, do not
+        modify it."""
+        with self._lock:
+            entry: Optional[Tuple[float, int, Dict[str, Any]]] = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.max_age:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        size: int = len(json.dumps(result, ensure_ascii=False))
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), size, result)
+            self._size += size
+            while self._size > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        self._size -= self._entries.pop(key)[1]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "size": self._size,
+        }
+
+
+RESULT_CACHE: ResultCache = ResultCache()
@@ -0,0 +1,57 @@
+import logging
+import time
+from typing import List, Sequence, Tuple
+
+from src.rules.rule_structures import GrammarRule
+
+LOGGER: logging.Logger = logging.getLogger(__name__)
+
+
+class GrammarEngine:
+    """Matches all grammar_regex rules against a text.
+
+    Every rule is compiled once when the rules are loaded and run with re.finditer on
+    its own. Merging the rules into one pattern was measured to be slower, since it
+    tries every rule at every position of the text and loses the fast search for
+    literal prefixes that a single regex gets.
+
+    Every scan has a time budget and every rule a max number of matches. Python can
+    not interrupt a regex while it is matching, so the budget is checked between
+    matches and the scan is abandoned when it runs out.
+
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[GrammarRule],
+        timeout: float = 1.0,
+        max_matches: int = 1000,
+    ) -> None:
+        self.rules: Tuple[GrammarRule, ...] = tuple(rules)
+        self.timeout: float = timeout
+        self.max_matches: int = max_matches
+
+    def scan(self, text: str) -> List[Tuple[GrammarRule, Tuple[int, int]]]:
+        """Returns every rule that matches the text together with the position of the
+        match. Empty matches are ignored."""
+        deadline: float = time.monotonic() + self.timeout
+        found: List[Tuple[GrammarRule, Tuple[int, int]]] = []
+
+        for rule in self.rules:
+            count: int = 0
+            for match in rule.regex.finditer(text):
+                if time.monotonic() > deadline:
+                    LOGGER.warning("Grammar rule timed out: %s", rule.message)
+                    return found
+                if match.end() == match.start():
+                    continue
+                if count >= self.max_matches:
+                    LOGGER.warning(
+                        "Only the first %s matches are kept for grammar rule: %s",
+                        self.max_matches,
+                        rule.message,
+                    )
+                    break
+                found.append((rule, match.span()))
+                count += 1
+        return found
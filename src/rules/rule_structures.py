@@ -1,25 +1,39 @@
 import re
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Union
+from typing import List, Optional, Pattern, Tuple
 
 
-@dataclass
+@dataclass(frozen=True)
 class NamedEntityRule:
     message: str
     identity: str
     type: Optional[str] = None
     subtype: Optional[str] = None
-    cheat: Optional[str] = None
+    cheat: Optional[Pattern[str]] = None
+    valid: Optional[Pattern[str]] = None
+    invalid: Optional[Pattern[str]] = None
 
 
-@dataclass
+@dataclass(frozen=True)
+class GrammarRule:
+    message: str
+    regex: Pattern[str]
+
+
+@dataclass(frozen=True, eq=False)
 class HeadlineRules:
     name: str
-    regex: Optional[str] = None
+    regex: Optional[Pattern[str]] = None
     order: Optional[int] = None
     required: bool = False
-    dependencies: List[List[str]] = field(default_factory=list)
-    named_entities: List[NamedEntityRule] = field(default_factory=list)
+    dependencies: Tuple[Tuple[str, ...], ...] = ()
+    named_entities: Tuple[NamedEntityRule, ...] = ()
+    name_regex: Pattern[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(
+            self, "name_regex", re.compile("^" + self.name + "\\W{0,}$", re.I)
+        )
 
     def matches_any(self, candidates: List[str]) -> bool:
         for candidate in candidates:
@@ -28,8 +42,8 @@ class HeadlineRules:
         return False
 
     def matches(self, candidate: str) -> bool:
-        if re.match("^" + self.name + "\\W{0,}$", candidate, re.I):
+        if self.name_regex.match(candidate):
             return True
-        if self.regex and re.match(self.regex, candidate, re.I):
+        if self.regex and self.regex.match(candidate):
             return True
         return False
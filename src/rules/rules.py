@@ -1,67 +1,213 @@
-from typing import List, Optional, Dict
+import hashlib
+import os
+import re
+import threading
+from typing import Any, Dict, FrozenSet, List, Match, Optional, Pattern, Tuple
 
 import yaml
 
-from src.rules.rule_structures import HeadlineRules, NamedEntityRule
+from src.rules.grammar import GrammarEngine
+from src.rules.rule_structures import GrammarRule, HeadlineRules, NamedEntityRule
+from src.rules.word_scanner import WordScanner
+
+RULES_PATH: str = "settings/rules"
+RULE_FILES: Tuple[str, ...] = (
+    "rules.yaml",
+    "headlines.yaml",
+    "forbidden_words.yaml",
+    "unwanted_words.yaml",
+    "police_abbreviations.yaml",
+)
+# Names of the word lists in the word scanner.
+FORBIDDEN_WORDS: str = "forbidden_words"
+UNWANTED_WORDS: str = "unwanted_words"
+POLICE_ABBREVIATIONS: str = "police_abbreviations"
+# Max number of resolved headline names remembered by a rule set.
+HEADLINE_INDEX_SIZE: int = 4096
 
 
 class Rules:
-    """All the rules for the report. The class is static since nothing is supposed to change
-    and should never be instansiated."""
-
-    def __init__(self):
-        self.headlines: List[HeadlineRules] = []
-        self._init_headline_rules()
-
-        self.lix_max: float
-        self.lix_min: float
-        self.tonality_max: float
-        self.tonality_min: float
-        self.spelling_skip_wordclasses: List[str] = []
-        self.citation_delimiters: List[str] = []
-        self.grammar_rules: List[Dict[str, str]]
-        self.named_entities: List[Dict[str, str]]
-        with open("settings/rules/rules.yaml", "r") as file:
-            rules = yaml.load(file, Loader=yaml.FullLoader)
-            self.lix_min = rules["lix"]["min"]
-            self.lix_max = rules["lix"]["max"]
-            self.tonality_min = rules["tonality"]["min"]
-            self.tonality_max = rules["tonality"]["max"]
-            self.spelling_skip_wordclasses = rules["spelling_skip_wordclasses"]
-            self.citation_delimiters = rules["citation_delimiters"]
-            self.grammar_regex = rules["grammar_regex"]
-            self.named_entities = rules["named_entities"]
-
-        self.forbidden_words: List[str] = []
-        with open("settings/rules/forbidden_words.yaml", "r") as file:
-            self.forbidden_words = yaml.load(file, Loader=yaml.FullLoader)
-
-        self.unwanted_words: List[Dict[str, str]]
-        with open("settings/rules/unwanted_words.yaml", "r") as file:
-            self.unwanted_words = yaml.load(file, Loader=yaml.FullLoader)
-
-        self.police_abbreviations: List[Dict[str, str]]
-        with open("settings/rules/police_abbreviations.yaml", "r") as file:
-            self.police_abbreviations = yaml.load(file, Loader=yaml.FullLoader)
-
-    def _init_headline_rules(self):
-        rules = {}
-        with open("settings/rules/headlines.yaml", "r") as file:
-            rules = yaml.load(file, Loader=yaml.FullLoader)
-
-        for hname, hrules in rules.items():
-            if "named_entities" in hrules:
-                hrules["named_entities"] = [
-                    NamedEntityRule(**ne) for ne in hrules["named_entities"]
-                ]
-
-            self.headlines.append(
-                HeadlineRules(name=hname, **hrules)
+    """All the rules for the report. Every regex is compiled and every word list is
+    turned into a set or a dict when the rules are loaded. The rules are never changed
+    after that, use get_rules() to get the instance shared by the whole process."""
+
+    def __init__(self, path: str = RULES_PATH) -> None:
+        self.path: str = path
+        # Read the modification times before the files so an edit made while loading
+        # triggers another reload.
+        self.mtimes: Tuple[float, ...] = rule_files_mtimes(path)
+        self.fingerprint: str = rule_files_fingerprint(path)
+
+        self.headlines: Tuple[HeadlineRules, ...] = self._init_headline_rules()
+        self._headline_regex: Optional[Pattern[str]] = self._init_headline_regex()
+        self._headline_index: Dict[str, Optional[HeadlineRules]] = {}
+        for headline in self.headlines:
+            self._headline_index[headline.name] = self._match_headline(headline.name)
+
+        rules: Dict[str, Any] = self._load("rules.yaml")
+        self.lix_min: float = rules["lix"]["min"]
+        self.lix_max: float = rules["lix"]["max"]
+        self.tonality_min: float = rules["tonality"]["min"]
+        self.tonality_max: float = rules["tonality"]["max"]
+        self.spelling_skip_wordclasses: FrozenSet[str] = frozenset(
+            rules["spelling_skip_wordclasses"]
+        )
+        self.citation_delimiters: FrozenSet[str] = frozenset(
+            rules["citation_delimiters"]
+        )
+        self.grammar_regex: Tuple[GrammarRule, ...] = tuple(
+            GrammarRule(message=rule["message"], regex=re.compile(rule["regex"], re.I))
+            for rule in rules["grammar_regex"]
+        )
+        self.grammar: GrammarEngine = GrammarEngine(self.grammar_regex)
+        self.named_entities: Tuple[NamedEntityRule, ...] = tuple(
+            _named_entity_rule(rule) for rule in rules["named_entities"]
+        )
+
+        self.forbidden_words: FrozenSet[str] = frozenset(
+            self._load("forbidden_words.yaml")
+        )
+        self.unwanted_words: Dict[str, str] = {
+            rule["word"]: rule["alternative"]
+            for rule in self._load("unwanted_words.yaml")
+        }
+        self.police_abbreviations: Dict[str, str] = {
+            rule["word"]: rule["means"]
+            for rule in self._load("police_abbreviations.yaml")
+        }
+
+        self.word_scanner: WordScanner = WordScanner(self.citation_delimiters)
+        self.word_scanner.add(
+            FORBIDDEN_WORDS,
+            {word: word for word in self.forbidden_words},
+            baseform=True,
+        )
+        self.word_scanner.add(UNWANTED_WORDS, self.unwanted_words)
+        self.word_scanner.add(
+            POLICE_ABBREVIATIONS, self.police_abbreviations, text=False, lower=True
+        )
+
+    def _load(self, filename: str) -> Any:
+        with open(os.path.join(self.path, filename), "r") as file:
+            return yaml.load(file, Loader=yaml.FullLoader)
+
+    def _init_headline_rules(self) -> Tuple[HeadlineRules, ...]:
+        headlines: List[HeadlineRules] = []
+        for hname, hrules in self._load("headlines.yaml").items():
+            headlines.append(
+                HeadlineRules(
+                    name=hname,
+                    regex=_compile(hrules.get("regex"), re.I),
+                    order=hrules.get("order"),
+                    required=hrules.get("required", False),
+                    dependencies=tuple(
+                        tuple(group) for group in hrules.get("dependencies", [])
+                    ),
+                    named_entities=tuple(
+                        _named_entity_rule(ne)
+                        for ne in hrules.get("named_entities", [])
+                    ),
+                )
             )
+        return tuple(headlines)
+
+    def _init_headline_regex(self) -> Optional[Pattern[str]]:
+        """Combine the name and regex of every headline into one alternation with a
+        named group per headline. The alternatives are tried in the same order as the
+        rules so the first matching rule wins. Returns None if a regex can not be
+        combined."""
+        alternatives: List[str] = []
+        for index, headline in enumerate(self.headlines):
+            alternative: str = headline.name + "\\W{0,}$"
+            if headline.regex:
+                if headline.regex.groupindex or re.search(
+                    r"\\\d|\(\?P=", headline.regex.pattern
+                ):
+                    return None
+                alternative += "|" + headline.regex.pattern
+            alternatives.append(f"(?P<h{index}>{alternative})")
+        try:
+            return re.compile("|".join(alternatives), re.I)
+        except re.error:
+            return None
+
+    def _match_headline(self, candidate: str) -> Optional[HeadlineRules]:
+        if self._headline_regex is None:
+            for headline in self.headlines:
+                if headline.matches(candidate):
+                    return headline
+            return None
+
+        match: Optional[Match[str]] = self._headline_regex.match(candidate)
+        if not match:
+            return None
+        for group, value in match.groupdict().items():
+            if value is not None:
+                return self.headlines[int(group[1:])]
+        return None
 
     def get_headline_rules(self, candidate: str) -> Optional[HeadlineRules]:
-        """Try to get the headline rules matching the candidate."""
-        for headline in self.headlines:
-            if headline.matches(candidate):
-                return headline
+        """Try to get the headline rules matching the candidate. Known headlines are
+        looked up in a dict, other candidates are matched against all headline rules at
+        once and remembered."""
+        try:
+            return self._headline_index[candidate]
+        except KeyError:
+            pass
+        headline: Optional[HeadlineRules] = self._match_headline(candidate)
+        if len(self._headline_index) < HEADLINE_INDEX_SIZE:
+            self._headline_index[candidate] = headline
+        return headline
+
+
+def _compile(regex: Optional[str], flags: int = 0) -> Optional[Pattern[str]]:
+    if regex is None:
         return None
+    return re.compile(regex, flags)
+
+
+def _named_entity_rule(rule: Dict[str, str]) -> NamedEntityRule:
+    return NamedEntityRule(
+        message=rule["message"],
+        identity=rule["identity"],
+        type=rule.get("type"),
+        subtype=rule.get("subtype"),
+        cheat=_compile(rule.get("cheat")),
+        valid=_compile(rule.get("valid"), re.I),
+        invalid=_compile(rule.get("invalid"), re.I),
+    )
+
+
+def rule_files_mtimes(path: str = RULES_PATH) -> Tuple[float, ...]:
+    """Modification times of all the rule files."""
+    return tuple(os.stat(os.path.join(path, name)).st_mtime for name in RULE_FILES)
+
+
+def rule_files_fingerprint(path: str = RULES_PATH) -> str:
+    """Hash of the content of all the rule files, changes whenever a rule does."""
+    digest = hashlib.sha256()
+    for name in RULE_FILES:
+        with open(os.path.join(path, name), "rb") as file:
+            digest.update(file.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+_RULES: Optional[Rules] = None
+_RULES_LOCK: threading.Lock = threading.Lock()
+
+
+def get_rules() -> Rules:
+    """Returns the rules shared by the process. The rules are loaded on first use and
+    replaced by a freshly loaded instance when any of the rule files are modified, so
+    edits take effect without a restart."""
+    global _RULES
+    rules: Optional[Rules] = _RULES
+    mtimes: Tuple[float, ...] = rule_files_mtimes()
+    if rules is not None and rules.mtimes == mtimes:
+        return rules
+
+    with _RULES_LOCK:
+        if _RULES is None or _RULES.mtimes != rule_files_mtimes():
+            _RULES = Rules()
+        return _RULES
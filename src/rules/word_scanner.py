@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Set, Tuple, Union
+
+from src.report.draft import DraftWord
+from src.report.word import Word
+
+
+@dataclass(frozen=True)
+class WordHit:
+    """A word that was found in one of the word lists."""
+
+    word: Union[Word, DraftWord]
+    index: int
+    in_citation: bool
+    value: str
+
+
+class WordScanner:
+    """Looks up every word of a report in all registered word lists in a single pass.
+
+    A word list is a mapping from a word to a value, like the alternative for an
+    unwanted word. Lists can match the text of a word as is, in lower case or any of
+    its baseforms. All lists share the same hash tables so adding more lists does not
+    add any work per word.
+
+    """
+
+    def __init__(self, citation_delimiters: FrozenSet[str]) -> None:
+        self.citation_delimiters: FrozenSet[str] = citation_delimiters
+        self.lists: List[str] = []
+        self._text: Dict[str, List[Tuple[str, str]]] = {}
+        self._lower: Dict[str, List[Tuple[str, str]]] = {}
+        self._baseform: Dict[str, List[Tuple[str, str]]] = {}
+
+    def add(
+        self,
+        name: str,
+        words: Mapping[str, str],
+        text: bool = True,
+        lower: bool = False,
+        baseform: bool = False,
+    ) -> None:
+        """Register the word list name and choose what it should be matched against."""
+        self.lists.append(name)
+        for table, enabled in (
+            (self._text, text),
+            (self._lower, lower),
+            (self._baseform, baseform),
+        ):
+            if not enabled:
+                continue
+            for word, value in words.items():
+                table.setdefault(word, []).append((name, value))
+
+    def scan(
+        self, words: Iterable[Union[Word, DraftWord]]
+    ) -> Dict[str, List[WordHit]]:
+        """Walk the words once and return the hits for every registered word list.
+        Citations are tracked here, it is up to the caller to decide if hits inside
+        citations matter. The words of a draft have no baseforms, so only the text of
+        the words are matched for them."""
+        hits: Dict[str, List[WordHit]] = {name: [] for name in self.lists}
+        in_citation: bool = False
+
+        for index, word in enumerate(words):
+            if word.text in self.citation_delimiters:
+                in_citation = not in_citation
+                continue
+
+            matches: List[Tuple[str, str]] = []
+            matches += self._text.get(word.text, [])
+            if self._lower:
+                matches += self._lower.get(word.text.lower(), [])
+            if self._baseform:
+                for baseform in word.baseform:
+                    matches += self._baseform.get(baseform, [])
+            if not matches:
+                continue
+
+            found: Set[str] = set()
+            for name, value in matches:
+                if name in found:
+                    continue
+                found.add(name)
+                hits[name].append(WordHit(word, index, in_citation, value))
+        return hits
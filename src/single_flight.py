@@ -0,0 +1,38 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Shares one computation between callers that ask for the same key at the same
+    time.
+
+    The first caller for a key starts the computation and the callers that ask for
+    the same key before it is done get the same future, so they all get its result or
+    its exception. The key is forgotten as soon as the computation is done.
+
+    """
+
+    def __init__(self) -> None:
+        self._futures: Dict[Hashable, "Future[T]"] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def run(self, key: Hashable, start: Callable[[], "Future[T]"]) -> "Future[T]":
+        """Returns the future for key, start() is only called if there is none. start()
+        must not block since it is called while holding the lock."""
+        with self._lock:
+            future: "Future[T]" = self._futures.get(key) or start()
+            self._futures[key] = future
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._futures)
+
+    def _forget(self, key: Hashable, future: "Future[T]") -> None:
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
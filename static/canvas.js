@@ -59,8 +59,7 @@ const missionComplete = () => {
 /**
  * Process the API response.
  */
-const processData = (JSONdata) => {
-  var data = JSON.parse(JSONdata)
+const processData = (data) => {
 
   var table = $('#analysisTable')
   var document = $('#document')
@@ -71,13 +70,17 @@ const processData = (JSONdata) => {
 
   if (data.code !== 200) {
     sendAlert(data.message)
-  } else if (data.data.has_errors) {
+  } else if (data.data.has_errors || data.data.skipped.length > 0) {
     data.data.errors.forEach((row) => {
       table.append('<button type="button" class="error-rows list-group-item-danger list-group-item-action selecttextbutton" data-start="' + row.start + '"' +
                    ' data-end="' + row.end + '">' + row.message + '</button>')
       // table.append('<p class="error-rows" data-start="' + row.start + '"' +
       //              ' data-end="' + row.end + '">' + row.message + '</p>')
     })
+    if (data.data.skipped.length > 0) {
+      table.append('<button type="button" class="list-group-item-warning list-group-item-action" disabled>' +
+                   skippedMessage(data.data.skipped) + '</button>')
+    }
     document.text(data.data.report)
     highlightErrors()
     changeCursorOnError()
@@ -89,6 +92,15 @@ const processData = (JSONdata) => {
   $('#turnInSpinner').hide()
 }
 
+/**
+ * Tell that some tests could not run, so a report without errors is not shown as
+ * clean when the analysis was not complete.
+ */
+const skippedMessage = (skipped) => {
+  return 'Följande tester kunde inte köras och rapporten kan innehålla fler fel: ' +
+         skipped.join(', ') + '.'
+}
+
 /**
 * Highlight error on click, uses markjs
 **/
@@ -130,7 +142,12 @@ const sendData = () => {
 
   // Define what happens on successful data submission
   XHR.addEventListener('load', (event) => {
-    processData(event.target.responseText)
+    var data = JSON.parse(event.target.responseText)
+    if (data.code === 202) {
+      pollJob(data.data.id)
+    } else {
+      processData(data)
+    }
   })
 
   // Define what happens in case of error
@@ -138,6 +155,31 @@ const sendData = () => {
     sendAlert('Oj! Något gick åt skogen.')
   })
 
-  XHR.open('POST', 'http://127.0.0.1:5000/api/docx')
+  XHR.open('POST', 'http://127.0.0.1:5000/api/jobs')
   XHR.send(formData)
 }
+
+/**
+ * Ask the API for the result of the analysis until the job is done.
+ */
+const pollJob = (id) => {
+  var XHR = new XMLHttpRequest()
+
+  XHR.addEventListener('load', (event) => {
+    var data = JSON.parse(event.target.responseText)
+    if (data.code !== 200) {
+      processData(data)
+    } else if (data.data.status === 'done') {
+      processData({ code: 200, message: data.message, data: data.data.result })
+    } else {
+      window.setTimeout(() => pollJob(id), 1000)
+    }
+  })
+
+  XHR.addEventListener('error', (event) => {
+    sendAlert('Oj! Något gick åt skogen.')
+  })
+
+  XHR.open('GET', 'http://127.0.0.1:5000/api/jobs/' + id)
+  XHR.send()
+}
@@ -43,8 +43,7 @@ const sendAlert = (message) => {
 /**
  * Process the API response.
  */
-const processData = (JSONdata) => {
-  var data = JSON.parse(JSONdata)
+const processData = (data) => {
 
   if (data.code !== 200) {
     sendAlert(data.message)
@@ -65,12 +64,25 @@ const processData = (JSONdata) => {
                    row.end + '</td><td>' + row.message + '</td></tr>')
     })
   }
-  tableCaption.text('Hittade ' + Object.keys(data.data.errors).length + ' fel.')
+  var caption = 'Hittade ' + Object.keys(data.data.errors).length + ' fel.'
+  if (data.data.skipped.length > 0) {
+    caption += ' ' + skippedMessage(data.data.skipped)
+  }
+  tableCaption.text(caption)
   document.text(data.data.report)
   highlightErrors()
   changeCursorOnError()
 }
 
+/**
+ * Tell that some tests could not run, so a report without errors is not shown as
+ * clean when the analysis was not complete.
+ */
+const skippedMessage = (skipped) => {
+  return 'Följande tester kunde inte köras och rapporten kan innehålla fler fel: ' +
+         skipped.join(', ') + '.'
+}
+
 /**
 * Highlight error on click, uses markjs
 **/
@@ -110,7 +122,12 @@ const sendData = () => {
 
   // Define what happens on successful data submission
   XHR.addEventListener('load', (event) => {
-    processData(event.target.responseText)
+    var data = JSON.parse(event.target.responseText)
+    if (data.code === 202) {
+      pollJob(data.data.id)
+    } else {
+      processData(data)
+    }
   })
 
   // Define what happens in case of error
@@ -118,6 +135,31 @@ const sendData = () => {
     sendAlert('Oj! Något gick åt skogen.')
   })
 
-  XHR.open('POST', 'http://127.0.0.1:5000/api/docx')
+  XHR.open('POST', 'http://127.0.0.1:5000/api/jobs')
   XHR.send(formData)
 }
+
+/**
+ * Ask the API for the result of the analysis until the job is done.
+ */
+const pollJob = (id) => {
+  var XHR = new XMLHttpRequest()
+
+  XHR.addEventListener('load', (event) => {
+    var data = JSON.parse(event.target.responseText)
+    if (data.code !== 200) {
+      processData(data)
+    } else if (data.data.status === 'done') {
+      processData({ code: 200, message: data.message, data: data.data.result })
+    } else {
+      window.setTimeout(() => pollJob(id), 1000)
+    }
+  })
+
+  XHR.addEventListener('error', (event) => {
+    sendAlert('Oj! Något gick åt skogen.')
+  })
+
+  XHR.open('GET', 'http://127.0.0.1:5000/api/jobs/' + id)
+  XHR.send()
+}